@@ -1,25 +1,119 @@
 from django.contrib import admin
 
 from .models import Category, Location, Post, Comment
+from .moderation import moderate_comments
+from .paginators import EstimatedCountPaginator
+
+
+class InputFilter(admin.SimpleListFilter):
+    """Фильтр с полем ввода вместо списка всех значений"""
+
+    template = 'admin/input_filter.html'
+    lookup = None
+
+    def lookups(self, request, model_admin):
+        # Без вариантов фильтр не выводится
+        return ((None, None),)
+
+    def choices(self, changelist):
+        all_choice = next(super().choices(changelist))
+        all_choice['query_parts'] = (
+            (key, value)
+            for key, value in changelist.get_filters_params().items()
+            if key != self.parameter_name)
+        yield all_choice
+
+    def queryset(self, request, queryset):
+        value = (self.value() or '').strip()
+        if value:
+            return queryset.filter(**{self.lookup: value})
+        return queryset
+
+
+class AuthorFilter(InputFilter):
+    title = 'автору'
+    parameter_name = 'author'
+    lookup = 'author__username'
+
+
+class LocationFilter(InputFilter):
+    title = 'местоположению'
+    parameter_name = 'location'
+    lookup = 'location__name'
+
+
+class PostFilter(InputFilter):
+    title = 'номеру поста'
+    parameter_name = 'post'
+    lookup = 'post_id'
+
+    def queryset(self, request, queryset):
+        if not (self.value() or '').strip().isdigit():
+            return queryset
+        return super().queryset(request, queryset)
 
 
 class CategoryAdmin(admin.ModelAdmin):
     list_display = ('title', 'description', 'is_published', 'slug',
                     'created_at')
     list_filter = ('title', 'is_published')
+    search_fields = ('title',)
 
 
 class LocationAdmin(admin.ModelAdmin):
     list_display = ('name', 'created_at', 'is_published')
+    search_fields = ('name',)
 
 
 class PostAdmin(admin.ModelAdmin):
     list_display = ('title', 'author', 'pub_date', 'category', 'is_published',
                     'location', 'created_at')
-    list_filter = ('author', 'is_published', 'location', 'category')
+    list_filter = (AuthorFilter, 'is_published', LocationFilter, 'category')
+    list_select_related = ('author', 'category', 'location')
+    search_fields = ('title',)
+    autocomplete_fields = ('author', 'category', 'location')
+    date_hierarchy = 'pub_date'
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).defer('text', 'text_html')
+
+
+class CommentAdmin(admin.ModelAdmin):
+    list_display = ('text', 'author', 'post', 'is_published', 'created_at')
+    list_filter = (AuthorFilter, PostFilter, 'is_published')
+    list_select_related = ('author', 'post')
+    autocomplete_fields = ('author', 'post')
+    date_hierarchy = 'created_at'
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
+    actions = ('hide_comments', 'delete_comments')
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).defer(
+            'text_html', 'post__text', 'post__text_html')
+
+    def get_actions(self, request):
+        # delete_selected удаляет по одному объекту с сигналами
+        actions = super().get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
+
+    @admin.action(description='Скрыть выбранные комментарии',
+                  permissions=['change'])
+    def hide_comments(self, request, queryset):
+        count = moderate_comments(queryset, 'hide')
+        self.message_user(request, f'Скрыто комментариев: {count}')
+
+    @admin.action(description='Удалить выбранные комментарии',
+                  permissions=['delete'])
+    def delete_comments(self, request, queryset):
+        count = moderate_comments(queryset, 'delete')
+        self.message_user(request, f'Удалено комментариев: {count}')
 
 
 admin.site.register(Category, CategoryAdmin)
 admin.site.register(Location, LocationAdmin)
 admin.site.register(Post, PostAdmin)
-admin.site.register(Comment)
+admin.site.register(Comment, CommentAdmin)
@@ -0,0 +1,43 @@
+from django.db import models
+from django.template.defaultfilters import linebreaksbr
+
+
+def render_text(text):
+    """Тот же HTML, что даёт фильтр linebreaksbr в шаблонах"""
+    return str(linebreaksbr(text or ''))
+
+
+def with_rendered_fields(model, update_fields):
+    """Добавляем к update_fields HTML полей, чей исходный текст сохраняется"""
+    update_fields = set(update_fields)
+    return update_fields | {
+        field.name for field in model._meta.concrete_fields
+        if isinstance(field, RenderedTextField)
+        and field.source in update_fields}
+
+
+class RenderedTextField(models.TextField):
+    """Экранированный HTML текстового поля ``source``.
+
+    Пересобирается при каждом сохранении модели, поэтому шаблонам
+    не нужно прогонять полный текст через фильтры на каждый показ.
+    """
+
+    def __init__(self, *args, source='text', **kwargs):
+        self.source = source
+        kwargs.setdefault('editable', False)
+        kwargs.setdefault('blank', True)
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs['source'] = self.source
+        del kwargs['editable']
+        if kwargs.get('blank'):
+            del kwargs['blank']
+        return name, path, args, kwargs
+
+    def pre_save(self, model_instance, add):
+        value = render_text(getattr(model_instance, self.source))
+        setattr(model_instance, self.attname, value)
+        return value
@@ -2,6 +2,7 @@ from django import forms
 from django.contrib.auth import get_user_model
 
 from .models import Post, Comment
+from .moderation import ACTIONS, select_comments
 
 
 User = get_user_model()
@@ -26,3 +27,28 @@ class ProfileForm(forms.ModelForm):
     class Meta:
         model = User
         fields = ('first_name', 'last_name', 'username', 'email',)
+
+
+class CommentModerationForm(forms.Form):
+    """Какие комментарии скрыть или удалить"""
+
+    action = forms.ChoiceField(choices=[(action, action)
+                                        for action in ACTIONS])
+    author = forms.ModelChoiceField(
+        User.objects.all(), to_field_name='username', required=False)
+    post = forms.ModelChoiceField(Post.objects.all(), required=False)
+    since = forms.DateTimeField(required=False)
+    until = forms.DateTimeField(required=False)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if not any(cleaned_data.get(field) for field in
+                   ('author', 'post', 'since', 'until')):
+            raise forms.ValidationError(
+                'Укажите автора, пост или период.')
+        return cleaned_data
+
+    def get_comments(self):
+        return select_comments(
+            **{field: self.cleaned_data[field] for field in
+               ('author', 'post', 'since', 'until')})
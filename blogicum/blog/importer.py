@@ -0,0 +1,197 @@
+# Импорт постов из NDJSON: одна строка — один пост вида
+# {"title": ..., "text": ..., "pub_date": ..., "author": "<username>",
+#  "category": "<slug>", "location": "<name>", "image_url": ...}.
+# Посты пишутся пачками через bulk_create, картинки скачивает пул потоков,
+# счётчики пересчитываются один раз в конце импорта, даже если он прервался:
+# записанные пачки уже зафиксированы.
+import json
+import posixpath
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+from urllib.request import urlopen
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import metrics, pagecache
+from .models import (AuthorStats, FeedEntry, Location, Post, PostCounter,
+                     User, make_excerpt)
+from .reference import categories, locations
+from .signals import post_scopes, reset_profile_headers
+
+REQUIRED_FIELDS = ('title', 'text', 'pub_date', 'author', 'category')
+OPTIONAL_FIELDS = ('location', 'image_url')
+
+
+def fetch_image(url):
+    """Скачиваем картинку и кладём её туда же, куда ImageField поста"""
+    if urlparse(url).scheme not in settings.BLOG_IMPORT_IMAGE_SCHEMES:
+        raise ValueError(f'Недопустимый адрес картинки: {url}')
+    with urlopen(url, timeout=settings.BLOG_IMPORT_IMAGE_TIMEOUT) as response:
+        content = response.read()
+    name = posixpath.basename(urlparse(url).path) or 'image'
+    return default_storage.save(f'post_images/{name}', ContentFile(content))
+
+
+def parse_record(line):
+    if isinstance(line, bytes):
+        line = line.decode('utf-8')
+    record = json.loads(line)
+    if not isinstance(record, dict):
+        raise ValueError('Ожидается объект JSON.')
+    missing = [field for field in REQUIRED_FIELDS if not record.get(field)]
+    if missing:
+        raise ValueError(f'Не заполнены поля: {", ".join(missing)}')
+    not_strings = [
+        field for field in REQUIRED_FIELDS + OPTIONAL_FIELDS
+        if record.get(field) is not None and not isinstance(
+            record[field], str)]
+    if not_strings:
+        raise ValueError(
+            f'Поля должны быть строками: {", ".join(not_strings)}')
+    if not isinstance(record.get('is_published', True), bool):
+        raise ValueError('Поле is_published должно быть true или false.')
+    max_length = Post._meta.get_field('title').max_length
+    if len(record['title']) > max_length:
+        raise ValueError(f'Заголовок длиннее {max_length} символов.')
+    pub_date = parse_datetime(record['pub_date'])
+    if pub_date is None:
+        raise ValueError(f'Неверная дата: {record["pub_date"]}')
+    if timezone.is_naive(pub_date):
+        pub_date = timezone.make_aware(pub_date)
+    record['pub_date'] = pub_date
+    return record
+
+
+class PostImporter:
+    """Импортирует посты; run() отдаёт отчёт по каждой пачке"""
+
+    def __init__(self, batch_size=None, workers=None):
+        self.batch_size = batch_size or settings.BLOG_IMPORT_BATCH_SIZE
+        self.workers = workers or settings.BLOG_IMPORT_IMAGE_WORKERS
+        self.authors = {}
+        self.locations = {}
+        self.scopes = set()
+        self.author_ids = set()
+
+    def run(self, lines):
+        try:
+            with ThreadPoolExecutor(self.workers) as self.pool:
+                batch = []
+                for number, line in enumerate(lines, 1):
+                    if not line.strip():
+                        continue
+                    batch.append((number, line))
+                    if len(batch) >= self.batch_size:
+                        yield self.import_batch(batch)
+                        batch = []
+                if batch:
+                    yield self.import_batch(batch)
+        finally:
+            self.finish()
+
+    def load_authors(self, usernames):
+        missing = set(usernames) - self.authors.keys()
+        self.authors.update(User.objects.filter(
+            username__in=missing).values_list('username', 'id'))
+
+    def load_locations(self, names):
+        """Места из старой системы заводим, если их ещё нет"""
+        missing = set(names) - self.locations.keys()
+        if not missing:
+            return
+        self.locations.update(Location.objects.filter(
+            name__in=missing).values_list('name', 'id'))
+        new = missing - self.locations.keys()
+        if new:
+            Location.objects.bulk_create(Location(name=name) for name in new)
+            self.locations.update(Location.objects.filter(
+                name__in=new).values_list('name', 'id'))
+            locations.invalidate()
+
+    def build_post(self, record):
+        author_id = self.authors.get(record['author'])
+        if author_id is None:
+            raise ValueError(f'Нет автора {record["author"]}')
+        category = categories.get(slug=record['category'])
+        if category is None:
+            raise ValueError(f'Нет категории {record["category"]}')
+        is_published = bool(record.get('is_published', True))
+        return Post(
+            title=record['title'], text=record['text'],
+            excerpt=make_excerpt(record['text']),
+            pub_date=record['pub_date'], is_published=is_published,
+            is_visible=is_published and category.is_published,
+            author_id=author_id, category_id=category.pk,
+            location_id=self.locations.get(record.get('location')))
+
+    def build_posts(self, batch, errors):
+        """Разбираем строки пачки в посты, пока без записи в базу"""
+        records = []
+        for number, line in batch:
+            try:
+                records.append((number, parse_record(line)))
+            except ValueError as error:
+                errors.append({'line': number, 'error': str(error)})
+        self.load_authors(record['author'] for _, record in records)
+        self.load_locations(record['location'] for _, record in records
+                            if record.get('location'))
+        posts = []
+        for number, record in records:
+            try:
+                posts.append((number, self.build_post(record),
+                              record.get('image_url')))
+            except ValueError as error:
+                errors.append({'line': number, 'error': str(error)})
+        return posts
+
+    def fetch_images(self, posts, errors):
+        images = {number: self.pool.submit(fetch_image, url)
+                  for number, _, url in posts if url}
+        for number, post, _ in posts:
+            if number in images:
+                try:
+                    post.image = images[number].result()
+                except (OSError, ValueError) as error:
+                    errors.append({'line': number, 'error': str(error)})
+
+    def import_batch(self, batch):
+        start = time.perf_counter()
+        errors = []
+        posts = self.build_posts(batch, errors)
+        self.fetch_images(posts, errors)
+        posts = [post for _, post, _ in posts]
+        with transaction.atomic():
+            last_pk = Post.objects.aggregate(last=Max('pk'))['last'] or 0
+            Post.objects.bulk_create(posts)
+            if all(post.pk for post in posts):
+                post_ids = [post.pk for post in posts]
+            else:
+                # SQLite не возвращает ключи из bulk_create
+                post_ids = list(Post.objects.filter(
+                    pk__gt=last_pk).values_list('pk', flat=True))
+            FeedEntry.objects.refresh(post_ids)
+        for post in posts:
+            self.scopes.update(post_scopes(post.category_id, post.author_id))
+            self.author_ids.add(post.author_id)
+        metrics.inc('blog_writes_total', len(posts), model='post',
+                    action='created')
+        seconds = time.perf_counter() - start
+        return {'created': len(posts), 'errors': errors,
+                'seconds': round(seconds, 3),
+                'posts_per_second': round(len(posts) / seconds, 1)}
+
+    def finish(self):
+        """Счётчики и статистику авторов пересчитываем один раз"""
+        if not self.scopes:
+            return
+        PostCounter.objects.refresh(*sorted(self.scopes))
+        AuthorStats.objects.filter(user_id__in=self.author_ids).delete()
+        reset_profile_headers(self.author_ids)
+        pagecache.invalidate()
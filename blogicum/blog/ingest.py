@@ -0,0 +1,112 @@
+# Приём комментариев. Комментарий сохраняется сразу, а счётчики ленты и
+# авторов и сброс шапок профилей процесс копит у себя и выполняет одной
+# пачкой не чаще BLOG_COMMENT_FLUSH_INTERVAL секунд. Остаток пачки
+# записывает таймер, даже если запросов больше нет, и выход процесса.
+# Если процесс убит и пачка пропала, счётчики чинит reconcile_counters.
+import atexit
+import logging
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import connections, transaction
+from django.dispatch import receiver
+
+from . import pagecache
+from .models import AuthorStats, FeedEntry, shift_comment_counts
+from .signals import reset_profile_headers
+
+logger = logging.getLogger(__name__)
+pending_posts = Counter()
+pending_authors = Counter()
+lock = threading.Lock()
+last_flush = 0.0
+timer = None
+
+
+def save_comment(comment):
+    """Сохраняем новый комментарий, счётчики обновятся пачкой"""
+    comment._coalesce_counts = True
+    comment.save()
+    with lock:
+        pending_posts[comment.post_id] += 1
+        pending_authors[comment.author_id] += 1
+    flush_quietly()
+    # Таймер заводим после фиксации: откат не должен попасть в пачку
+    transaction.on_commit(schedule_flush)
+    return comment
+
+
+def flush(force=False):
+    global last_flush
+    with lock:
+        now = time.monotonic()
+        if not force and (
+                now - last_flush < settings.BLOG_COMMENT_FLUSH_INTERVAL):
+            return
+        last_flush = now
+        posts, authors = dict(pending_posts), dict(pending_authors)
+        pending_posts.clear()
+        pending_authors.clear()
+    if not posts:
+        return
+    try:
+        with transaction.atomic():
+            shift_comment_counts(FeedEntry.objects, 'post_id', posts)
+            shift_comment_counts(AuthorStats.objects, 'user_id', authors)
+    except Exception:
+        # Вернём пачку, её запишет следующая попытка
+        with lock:
+            pending_posts.update(posts)
+            pending_authors.update(authors)
+        raise
+    reset_profile_headers(authors)
+    pagecache.invalidate()
+
+
+def flush_quietly(force=False):
+    """Сбой записи пачки не роняет запрос, её запишет следующая попытка"""
+    try:
+        flush(force)
+    except Exception:
+        logger.exception('Не удалось записать счётчики комментариев')
+
+
+def schedule_flush():
+    """Запишем остаток пачки по окончании окна, даже без запросов"""
+    global timer
+    with lock:
+        if timer is not None or not pending_posts:
+            return
+        timer = threading.Timer(settings.BLOG_COMMENT_FLUSH_INTERVAL,
+                                flush_on_timer)
+        timer.daemon = True
+        timer.start()
+
+
+def flush_on_timer():
+    global timer
+    with lock:
+        timer = None
+    flush_pending()
+
+
+@atexit.register
+def flush_pending():
+    """Записываем остаток пачки вне запроса: по таймеру и при выходе"""
+    if not pending_posts:
+        return
+    try:
+        flush_quietly(force=True)
+    finally:
+        # Соединения этого потока никто, кроме нас, не закроет
+        connections.close_all()
+
+
+@receiver(request_started)
+def flush_on_request(sender, **kwargs):
+    """Остаток пачки уходит с первым запросом после окна"""
+    if pending_posts:
+        flush_quietly()
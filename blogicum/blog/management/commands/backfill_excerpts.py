@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from blog.models import FeedEntry, Post, make_excerpt
+
+
+class Command(BaseCommand):
+    help = 'Заполняет отрывки постов для карточек пачками'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, batch_size, **options):
+        last_pk = 0
+        updated = 0
+        while True:
+            posts = list(Post.objects.filter(pk__gt=last_pk).order_by(
+                'pk').only('pk', 'text', 'excerpt')[:batch_size])
+            if not posts:
+                break
+            changed = []
+            for post in posts:
+                excerpt = make_excerpt(post.text)
+                if post.excerpt != excerpt:
+                    post.excerpt = excerpt
+                    changed.append(post)
+            with transaction.atomic():
+                Post.objects.bulk_update(changed, ['excerpt'])
+                FeedEntry.objects.bulk_update(
+                    [FeedEntry(post_id=post.pk, excerpt=post.excerpt)
+                     for post in changed], ['excerpt'])
+            updated += len(changed)
+            last_pk = posts[-1].pk
+        self.stdout.write(f'Обновлено отрывков: {updated}')
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from blog.fields import render_text
+from blog.models import Comment, Post
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает HTML текстов постов и комментариев пачками'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def backfill(self, model, batch_size):
+        last_pk = 0
+        updated = 0
+        while True:
+            items = list(model.objects.filter(pk__gt=last_pk).order_by(
+                'pk').only('pk', 'text', 'text_html')[:batch_size])
+            if not items:
+                return updated
+            changed = []
+            for item in items:
+                text_html = render_text(item.text)
+                if item.text_html != text_html:
+                    item.text_html = text_html
+                    changed.append(item)
+            with transaction.atomic():
+                model.objects.bulk_update(changed, ['text_html'])
+            updated += len(changed)
+            last_pk = items[-1].pk
+
+    def handle(self, *args, batch_size, **options):
+        for model in (Post, Comment):
+            updated = self.backfill(model, batch_size)
+            self.stdout.write(
+                f'{model._meta.verbose_name_plural}: обновлено {updated}')
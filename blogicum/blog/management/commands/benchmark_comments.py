@@ -0,0 +1,59 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from blog import ingest
+from blog.models import Category, Comment, FeedEntry, Post, User
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает скорость приёма комментариев к одному посту'
+            ' до и после пакетного обновления счётчиков; все записи'
+            ' откатываются')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--comments', type=int, default=500)
+        parser.add_argument(
+            '--flush-interval', type=float, default=2,
+            help='Окно пакетного обновления счётчиков, в секундах.')
+
+    def naive(self, post_id, author):
+        """Как раньше: целый пост и обновление счётчиков на каждую запись"""
+        post = Post.objects.get(id=post_id)
+        Comment(post=post, author=author, text='Комментарий').save()
+
+    def coalesced(self, post_id, author):
+        if Post.objects.filter(id=post_id).exists():
+            ingest.save_comment(Comment(
+                post_id=post_id, author=author, text='Комментарий'))
+
+    def measure(self, func, post_id, author, comments):
+        with CaptureQueriesContext(connection) as ctx:
+            start = time.perf_counter()
+            for _ in range(comments):
+                func(post_id, author)
+            ingest.flush(force=True)
+            elapsed = time.perf_counter() - start
+        return comments / elapsed, len(ctx.captured_queries) / comments
+
+    def handle(self, *args, comments, flush_interval, **options):
+        with transaction.atomic(), override_settings(
+                BLOG_COMMENT_FLUSH_INTERVAL=flush_interval):
+            author = User.objects.create(username='benchmark_comments')
+            category = Category.objects.create(
+                title='Бенчмарк', description='-', slug='benchmark-comments')
+            post = Post.objects.create(
+                title='Популярный пост', text='Текст', author=author,
+                category=category, pub_date=category.created_at)
+            for name, func in (('naive', self.naive),
+                               ('coalesced', self.coalesced)):
+                rate, queries = self.measure(func, post.id, author, comments)
+                self.stdout.write(f'{name}: {rate:.0f} комментариев/с, '
+                                  f'{queries:.1f} запросов на комментарий')
+            counted = FeedEntry.objects.get(pk=post.pk).comment_count
+            transaction.set_rollback(True)
+            if counted != 2 * comments:
+                raise CommandError(
+                    f'В ленте {counted} комментариев вместо {2 * comments}')
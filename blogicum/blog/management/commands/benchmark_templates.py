@@ -0,0 +1,55 @@
+import timeit
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.core.paginator import Paginator
+from django.template.loader import render_to_string
+from django.test import RequestFactory
+from django.urls import resolve
+from django.utils import timezone
+
+from blog.models import FeedEntry
+from blog.views import POSTS_QNT
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает время рендера страницы ленты из 10 карточек'
+            ' в шаблонах Django и Jinja2')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200)
+
+    def get_context(self):
+        """Карточки собираем в памяти, база не нужна"""
+        posts = [FeedEntry(
+            post_id=i, pub_date=timezone.now(), title=f'Пост {i}',
+            excerpt='Первые десять слов текста поста для карточки ленты …',
+            author_id=1, author_username='author', category_id=1,
+            category_slug='travel', category_title='Путешествия',
+            location_id=1, location_name='Москва', comment_count=i,
+        ).as_post() for i in range(1, 1001)]
+        page_obj = Paginator(posts, POSTS_QNT).page(50)
+        return {'page_obj': page_obj, 'paginator': page_obj.paginator,
+                'is_paginated': True, 'object_list': page_obj.object_list}
+
+    def handle(self, *args, iterations, **options):
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        request.resolver_match = resolve('/')
+        context = self.get_context()
+        if not any(engine.get('NAME') == 'jinja2'
+                   for engine in settings.TEMPLATES):
+            raise CommandError('Jinja2 не установлен.')
+        results = {}
+        for engine in ('django', 'jinja2'):
+            def render():
+                render_to_string('blog/index.html', context,
+                                 request=request, using=engine)
+            render()
+            results[engine] = timeit.timeit(
+                render, number=iterations) / iterations * 1000
+            self.stdout.write(f'{engine}: {results[engine]:.2f} мс')
+        self.stdout.write(
+            f'Jinja2 быстрее в {results["django"] / results["jinja2"]:.1f}'
+            ' раза')
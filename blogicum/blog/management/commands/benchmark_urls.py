@@ -0,0 +1,81 @@
+import timeit
+
+from django.core.management.base import BaseCommand
+from django.template import Context, Template
+from django.urls import reverse
+from django.utils import timezone
+
+from blog.models import Comment, Post, User
+from blog.paths import fast_reverse
+
+# Цикл комментариев в том виде, в каком он был до кэширования адресов
+URL_TAG_COMMENTS = Template("""
+{% for comment in comments %}
+  <a href="{% url 'blog:profile' comment.author.username %}">
+    @{{ comment.author.username }}</a>
+  {{ comment.text_html|safe }}
+  {% if user == comment.author %}
+    <a href="{% url 'blog:edit_comment' post.id comment.id %}">edit</a>
+    <a href="{% url 'blog:delete_comment' post.id comment.id %}">delete</a>
+  {% endif %}
+{% endfor %}
+""")
+FAST_URL_COMMENTS = Template("""
+{% for comment in comments %}
+  <a href="{{ comment.get_author_url }}">
+    @{{ comment.author.username }}</a>
+  {{ comment.text_html|safe }}
+  {% if user == comment.author %}
+    <a href="{{ comment.get_edit_url }}">edit</a>
+    <a href="{{ comment.get_delete_url }}">delete</a>
+  {% endif %}
+{% endfor %}
+""")
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает reverse() и закэшированные адреса на странице'
+            ' поста с 1000 комментариев')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--comments', type=int, default=1000)
+        parser.add_argument('--iterations', type=int, default=20)
+
+    def measure(self, func, iterations):
+        func()
+        return timeit.timeit(func, number=iterations) / iterations * 1000
+
+    def handle(self, *args, comments, iterations, **options):
+        author = User(id=1, username='author')
+        post = Post(id=1, author=author)
+        context = Context({'post': post, 'user': author, 'comments': [
+            Comment(id=i, post=post, author=author,
+                    text_html='Текст комментария',
+                    created_at=timezone.now())
+            for i in range(1, comments + 1)]})
+        # Проверяем, что оба способа дают одни и те же адреса
+        assert fast_reverse('blog:edit_comment', 1, 2) == reverse(
+            'blog:edit_comment', args=[1, 2])
+
+        def slow():
+            for i in range(comments):
+                reverse('blog:profile', args=['author'])
+                reverse('blog:edit_comment', args=[1, i])
+
+        def fast():
+            for i in range(comments):
+                fast_reverse('blog:profile', 'author')
+                fast_reverse('blog:edit_comment', 1, i)
+
+        for title, before, after in (
+            ('Адреса', slow, fast),
+            ('Рендер комментариев',
+             lambda: URL_TAG_COMMENTS.render(context),
+             lambda: FAST_URL_COMMENTS.render(context)),
+        ):
+            before_ms = self.measure(before, iterations)
+            after_ms = self.measure(after, iterations)
+            self.stdout.write(
+                f'{title}: reverse() {before_ms:.1f} мс,'
+                f' кэш {after_ms:.1f} мс'
+                f' (в {before_ms / after_ms:.1f} раза быстрее)')
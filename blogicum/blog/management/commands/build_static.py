@@ -0,0 +1,45 @@
+import gzip
+import os
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE = ('.css', '.js', '.svg', '.ico', '.json', '.txt', '.xml',
+                '.html', '.map')
+
+
+class Command(BaseCommand):
+    help = ('Собирает статику с хэшами в именах и манифестом и кладёт'
+            ' рядом сжатые gzip и brotli копии')
+
+    def compress(self, path):
+        with open(path, 'rb') as source:
+            content = source.read()
+        variants = {'.gz': gzip.compress(content, 9, mtime=0)}
+        if brotli is not None:
+            variants['.br'] = brotli.compress(content)
+        written = 0
+        for suffix, compressed in variants.items():
+            # Сжатая копия нужна, только если она заметно меньше
+            if len(compressed) < len(content) * 0.9:
+                with open(path + suffix, 'wb') as target:
+                    target.write(compressed)
+                written += 1
+        return written
+
+    def handle(self, *args, **options):
+        call_command('collectstatic', interactive=False, verbosity=0)
+        written = 0
+        for root, _, files in os.walk(settings.STATIC_ROOT):
+            for name in files:
+                if name.endswith(COMPRESSIBLE):
+                    written += self.compress(os.path.join(root, name))
+        self.stdout.write(f'Сжатых копий: {written}')
+        if brotli is None:
+            self.stdout.write('brotli не установлен, только gzip.')
@@ -0,0 +1,34 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from blog.importer import PostImporter
+
+
+class Command(BaseCommand):
+    help = 'Импортирует посты из файла NDJSON, по посту на строку'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл NDJSON или - для stdin.')
+        parser.add_argument('--batch-size', type=int)
+        parser.add_argument(
+            '--workers', type=int,
+            help='Сколько картинок скачивать одновременно.')
+
+    def handle(self, *args, path, batch_size, workers, **options):
+        importer = PostImporter(batch_size=batch_size, workers=workers)
+        created = errors = 0
+        with (open(path, encoding='utf-8') if path != '-'
+              else sys.stdin) as lines:
+            for number, report in enumerate(importer.run(lines), 1):
+                created += report['created']
+                errors += len(report['errors'])
+                self.stdout.write(
+                    f'Пачка {number}: {report["created"]} постов за '
+                    f'{report["seconds"]} с, '
+                    f'{report["posts_per_second"]} постов/с')
+                for error in report['errors']:
+                    self.stderr.write(
+                        f'Строка {error["line"]}: {error["error"]}')
+        self.stdout.write(f'Импортировано постов: {created}, '
+                          f'ошибок: {errors}')
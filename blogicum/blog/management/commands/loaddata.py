@@ -0,0 +1,36 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.commands import loaddata
+
+from blog import pagecache
+from blog.models import AuthorStats, User
+from blog.profiles import forget_profiles
+from blog.reference import categories, locations
+from blog.signals import reset_profile_headers
+
+
+class Command(loaddata.Command):
+    help = (f'{loaddata.Command.help} Сигналы блога при загрузке не'
+            ' срабатывают, поэтому после неё пересчитываются видимость'
+            ' постов, отрывки, HTML, лента и счётчики.')
+
+    def handle(self, *fixture_labels, **options):
+        super().handle(*fixture_labels, **options)
+        if any(model._meta.app_label == 'blog' or model is User
+               for model in self.models):
+            self.refresh_blog(options['verbosity'])
+
+    def refresh_blog(self, verbosity):
+        stdout = self.stdout if verbosity > 0 else StringIO()
+        # Отрывки нужны ленте, видимость — счётчикам и ленте
+        for command in ('reconcile_counters', 'backfill_excerpts',
+                        'backfill_html', 'rebuild_feed'):
+            call_command(command, stdout=stdout)
+        AuthorStats.objects.all().delete()
+        users = dict(User.objects.values_list('pk', 'username'))
+        reset_profile_headers(users)
+        forget_profiles(users.values())
+        categories.invalidate()
+        locations.invalidate()
+        pagecache.invalidate()
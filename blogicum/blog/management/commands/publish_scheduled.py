@@ -0,0 +1,54 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Min
+from django.utils import timezone
+
+from blog.models import Post, PostCounter, PublishWatermark
+from blog.signals import post_became_visible
+
+
+class Command(BaseCommand):
+    help = ('Ждёт наступления отложенных публикаций и обновляет'
+            ' счётчики и ленту, когда посты становятся видны')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Обработать наступившие публикации и выйти.')
+        parser.add_argument(
+            '--max-sleep', type=int, default=60,
+            help='Максимальная пауза между проверками, в секундах.')
+
+    def due_posts(self, since, until):
+        return Post.objects.filter(
+            is_visible=True, pub_date__gt=since, pub_date__lte=until)
+
+    def handle(self, *args, once, max_sleep, **options):
+        since = PublishWatermark.objects.published_until()
+        if since is None:
+            # Первый запуск: счётчики помнят самую раннюю отложенную
+            # публикацию, если её ещё не сдвинул get_count()
+            first_due = PostCounter.objects.aggregate(
+                first_due=Min('due_at'))['first_due']
+            since = (first_due - timedelta(microseconds=1)
+                     if first_due else timezone.now())
+        while True:
+            now = timezone.now()
+            post_ids = list(self.due_posts(since, now).values_list(
+                'pk', flat=True))
+            if post_ids:
+                post_became_visible.send(sender=Post, post_ids=post_ids)
+                self.stdout.write(f'Опубликовано постов: {len(post_ids)}')
+            PublishWatermark.objects.advance(now)
+            since = now
+            if once:
+                return
+            next_due = Post.objects.filter(
+                is_visible=True, pub_date__gt=now).aggregate(
+                    next_due=Min('pub_date'))['next_due']
+            pause = max_sleep
+            if next_due is not None:
+                pause = min(pause, (next_due - now).total_seconds())
+            time.sleep(max(pause, 0))
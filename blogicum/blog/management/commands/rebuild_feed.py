@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from blog.models import FeedEntry, Post
+
+
+class Command(BaseCommand):
+    help = 'Заново собирает готовую ленту главной страницы'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, batch_size, **options):
+        post_ids = list(Post.objects.values_list('pk', flat=True))
+        with transaction.atomic():
+            FeedEntry.objects.all().delete()
+            for start in range(0, len(post_ids), batch_size):
+                FeedEntry.objects.refresh(post_ids[start:start + batch_size])
+        self.stdout.write(
+            f'В ленте записей: {FeedEntry.objects.count()}')
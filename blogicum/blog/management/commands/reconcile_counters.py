@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from blog import pagecache
+from blog.models import AuthorStats, Category, FeedEntry, Post, PostCounter
+from blog.signals import reset_profile_headers
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает видимость постов, счётчики постов и'
+            ' комментариев; нужна после аварийной остановки процесса,'
+            ' не успевшего записать пачку счётчиков из blog.ingest')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'scopes', nargs='*',
+            help="Ленты вида index, category:<id>, author:<id>;"
+                 " по умолчанию все.")
+
+    def handle(self, *args, scopes, **options):
+        Post.objects.refresh_visibility()
+        if not scopes:
+            scopes = ['index']
+            scopes += [f'category:{pk}' for pk in
+                       Category.objects.values_list('pk', flat=True)]
+            scopes += [f'author:{pk}' for pk in
+                       Post.objects.values_list(
+                           'author_id', flat=True).distinct()]
+            scopes += PostCounter.objects.exclude(
+                scope__in=scopes).values_list('scope', flat=True)
+        PostCounter.objects.refresh(*scopes)
+        self.stdout.write(f'Пересчитано счётчиков: {len(scopes)}')
+        FeedEntry.objects.recount_comments()
+        AuthorStats.objects.recount_comments()
+        reset_profile_headers(
+            AuthorStats.objects.values_list('user_id', flat=True))
+        pagecache.invalidate()
+        self.stdout.write('Пересчитаны счётчики комментариев')
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from blog.models import SlowQuery
+
+ORDERINGS = {
+    'time': '-total_time',
+    'count': '-count',
+    'max': '-max_time',
+}
+
+
+class Command(BaseCommand):
+    help = 'Показывает самые тяжёлые медленные запросы по представлениям'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=10)
+        parser.add_argument('--order', choices=ORDERINGS, default='time')
+        parser.add_argument('--explain', action='store_true',
+                            help='Печатать план запроса.')
+        parser.add_argument('--clear', action='store_true',
+                            help='Очистить журнал после вывода.')
+
+    def handle(self, *args, limit, order, explain, clear, **options):
+        queries = SlowQuery.objects.order_by(ORDERINGS[order])[:limit]
+        for query in queries:
+            self.stdout.write(
+                f'{query.view_name or "—"}: {query.count} раз,'
+                f' всего {query.total_time * 1000:.0f} мс,'
+                f' максимум {query.max_time * 1000:.0f} мс')
+            self.stdout.write(f'  {query.sql}')
+            if explain and query.explain:
+                for line in query.explain.splitlines():
+                    self.stdout.write(f'    {line}')
+        if clear:
+            SlowQuery.objects.all().delete()
@@ -0,0 +1,160 @@
+# Метрики блога в формате Prometheus. Каждый процесс копит счётчики
+# у себя в памяти без блокировок и время от времени сбрасывает их
+# в свой файл в BLOG_METRICS_DIR; /metrics складывает файлы всех процессов.
+# Сброс работает с копиями словарей и под замком, чтобы потоки процесса
+# не писали файл одновременно.
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from django.conf import settings
+from django.utils import timezone
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+HELP = {
+    'blog_request_duration_seconds': 'Время ответа по имени URL.',
+    'blog_db_queries_total': 'Число SQL-запросов по имени URL.',
+    'blog_db_query_seconds_total': 'Время SQL-запросов по имени URL.',
+    'blog_cache_requests_total': 'Обращения к кэшам: hit или miss.',
+    'blog_writes_total': 'Записи постов и комментариев.',
+}
+
+counters = defaultdict(float)
+histograms = {}
+gauges = {}
+last_flush = 0.0
+flush_lock = threading.Lock()
+
+
+def labels_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def inc(name, value=1, **labels):
+    counters[name, labels_key(labels)] += value
+
+
+def observe(name, value, **labels):
+    key = name, labels_key(labels)
+    histogram = histograms.get(key)
+    if histogram is None:
+        histogram = histograms[key] = [0] * len(BUCKETS) + [0.0, 0]
+    for i, bound in enumerate(BUCKETS):
+        if value <= bound:
+            histogram[i] += 1
+    histogram[-2] += value
+    histogram[-1] += 1
+
+
+def gauge(name, help_text):
+    """Регистрирует функцию, которая считает значение при выгрузке"""
+    def decorator(func):
+        gauges[name] = (help_text, func)
+        return func
+    return decorator
+
+
+def cache_hit(cache, hit):
+    inc('blog_cache_requests_total', cache=cache,
+        result='hit' if hit else 'miss')
+
+
+def metrics_dir():
+    path = Path(settings.BLOG_METRICS_DIR)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def flush(force=False):
+    """Сбрасываем метрики процесса в его файл, не чаще интервала"""
+    global last_flush
+    with flush_lock:
+        now = time.monotonic()
+        if not force and (
+                now - last_flush < settings.BLOG_METRICS_FLUSH_INTERVAL):
+            return
+        last_flush = now
+        # Другие потоки тем временем добавляют метки и значения
+        snapshot = {
+            'counters': [[name, labels, value]
+                         for (name, labels), value in counters.copy().items()],
+            'histograms': [[name, labels, list(values)]
+                           for (name, labels), values
+                           in histograms.copy().items()],
+        }
+        path = metrics_dir() / f'{os.getpid()}.json'
+        tmp_path = path.with_suffix('.tmp')
+        tmp_path.write_text(json.dumps(snapshot))
+        os.replace(tmp_path, path)
+
+
+def collect():
+    """Складываем метрики всех процессов"""
+    flush(force=True)
+    total_counters = defaultdict(float)
+    total_histograms = {}
+    for path in metrics_dir().glob('*.json'):
+        try:
+            data = json.loads(path.read_text())
+        except (OSError, ValueError):
+            continue
+        for name, labels, value in data['counters']:
+            total_counters[name, labels_key(dict(labels))] += value
+        for name, labels, values in data['histograms']:
+            key = name, labels_key(dict(labels))
+            if key in total_histograms:
+                total_histograms[key] = [
+                    a + b for a, b in zip(total_histograms[key], values)]
+            else:
+                total_histograms[key] = values
+    return total_counters, total_histograms
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{%s}' % ','.join(
+        '{}="{}"'.format(key, str(value).replace('\\', '\\\\')
+                         .replace('"', '\\"').replace('\n', '\\n'))
+        for key, value in labels)
+
+
+def render():
+    """Текст метрик в формате Prometheus"""
+    total_counters, total_histograms = collect()
+    lines = []
+    seen = set()
+
+    def header(name, kind, help_text=None):
+        if name not in seen:
+            seen.add(name)
+            lines.append(f'# HELP {name} {help_text or HELP.get(name, name)}')
+            lines.append(f'# TYPE {name} {kind}')
+
+    for (name, labels), value in sorted(total_counters.items()):
+        header(name, 'counter')
+        lines.append(f'{name}{format_labels(labels)} {value}')
+    for (name, labels), values in sorted(total_histograms.items()):
+        header(name, 'histogram')
+        for bound, count in zip(BUCKETS, values):
+            bucket_labels = format_labels(labels + (('le', bound),))
+            lines.append(f'{name}_bucket{bucket_labels} {count}')
+        inf_labels = format_labels(labels + (('le', '+Inf'),))
+        lines.append(f'{name}_bucket{inf_labels} {values[-1]}')
+        lines.append(f'{name}_sum{format_labels(labels)} {values[-2]}')
+        lines.append(f'{name}_count{format_labels(labels)} {values[-1]}')
+    for name, (help_text, func) in sorted(gauges.items()):
+        header(name, 'gauge', help_text)
+        lines.append(f'{name} {func()}')
+    return '\n'.join(lines) + '\n'
+
+
+@gauge('blog_scheduled_posts', 'Отложенные посты в очереди на публикацию.')
+def scheduled_posts():
+    from .models import Post
+
+    return Post.objects.filter(
+        is_visible=True, pub_date__gt=timezone.now()).count()
@@ -0,0 +1,366 @@
+import hashlib
+import logging
+import mimetypes
+import os
+import random
+import re
+import time
+from collections import deque
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import SuspiciousFileOperation
+from django.db import connections, transaction
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified
+from django.urls import Resolver404, resolve
+from django.utils.cache import patch_vary_headers
+from django.utils._os import safe_join
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+from . import metrics, pagecache
+from .models import SlowQuery
+
+logger = logging.getLogger(__name__)
+# Последние замеры профилировщика в этом процессе
+samples = deque(maxlen=settings.BLOG_PROFILING_BUFFER_SIZE)
+# Имя с хэшем от ManifestStaticFilesStorage: bootstrap.min.0123456789ab.css
+HASHED_NAME = re.compile(r'\.[0-9a-f]{12}\.[^/]+$')
+
+
+def accepted_encodings(request):
+    """Сжатия из Accept-Encoding, кроме явно запрещённых q=0"""
+    encodings = set()
+    for part in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        coding, _, params = part.strip().partition(';')
+        if coding and params.replace(' ', '') not in ('q=0', 'q=0.0'):
+            encodings.add(coding.strip().lower())
+    return encodings
+
+
+class StaticFilesMiddleware:
+    """Отдаёт собранную build_static статику без отдельного веб-сервера.
+
+    Файлы с хэшем в имени кэшируются браузером навсегда, сжатые копии
+    .br и .gz выбираются по Accept-Encoding.
+    """
+
+    encodings = (('br', '.br'), ('gzip', '.gz'))
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        prefix = settings.STATIC_URL
+        if request.method in ('GET', 'HEAD') and request.path.startswith(
+                prefix):
+            response = self.serve(request, request.path[len(prefix):])
+            if response is not None:
+                return response
+        return self.get_response(request)
+
+    def serve(self, request, name):
+        try:
+            path = safe_join(settings.STATIC_ROOT, name)
+        except SuspiciousFileOperation:
+            return None
+        if not os.path.isfile(path):
+            return None
+        encoding, served_path = None, path
+        accepted = accepted_encodings(request)
+        for coding, suffix in self.encodings:
+            if coding in accepted and os.path.isfile(path + suffix):
+                encoding, served_path = coding, path + suffix
+                break
+        stat = os.stat(served_path)
+        if not was_modified_since(request.META.get('HTTP_IF_MODIFIED_SINCE'),
+                                  stat.st_mtime, stat.st_size):
+            return HttpResponseNotModified()
+        content_type, _ = mimetypes.guess_type(path)
+        response = FileResponse(
+            open(served_path, 'rb'),
+            content_type=content_type or 'application/octet-stream')
+        response['Last-Modified'] = http_date(stat.st_mtime)
+        response['Vary'] = 'Accept-Encoding'
+        if encoding:
+            response['Content-Encoding'] = encoding
+        if HASHED_NAME.search(name):
+            response['Cache-Control'] = 'public, max-age=31536000, immutable'
+        else:
+            response['Cache-Control'] = (
+                f'public, max-age={settings.BLOG_STATIC_MAX_AGE}')
+        return response
+
+
+class PageCacheMiddleware:
+    """Отдаёт анонимным читателям готовые страницы ленты из кэша.
+
+    Кэшируются GET-запросы к представлениям из BLOG_PAGE_CACHE_VIEWS
+    без сессии и сообщений; сжатые копии страницы готовит pagecache.
+    """
+
+    cookies = (settings.SESSION_COOKIE_NAME, 'messages')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not self.is_cacheable(request):
+            return self.get_response(request)
+        key = pagecache.page_key(request)
+        entry = cache.get(key)
+        metrics.cache_hit('page', entry is not None)
+        if entry is None:
+            response = self.get_response(request)
+            if not self.can_store(request, response):
+                return response
+            entry = pagecache.store(key, response)
+        return self.respond(request, entry)
+
+    def is_cacheable(self, request):
+        if request.method not in ('GET', 'HEAD') or any(
+                name in request.COOKIES for name in self.cookies):
+            return False
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return False
+        # Для метрик на попадании: до представления запрос не дойдёт
+        request.resolver_match = match
+        return match.view_name in settings.BLOG_PAGE_CACHE_VIEWS
+
+    def can_store(self, request, response):
+        return (response.status_code == 200
+                and not response.streaming
+                and not response.cookies
+                and not response.has_header('Content-Encoding')
+                and not request.META.get('CSRF_COOKIE_USED')
+                and response.get('Content-Type', '').startswith('text/html'))
+
+    def respond(self, request, entry):
+        accepted = accepted_encodings(request)
+        encoding = next((coding for coding in pagecache.ENCODINGS
+                         if coding in accepted and coding in entry['bodies']),
+                        'identity')
+        response = HttpResponse(entry['bodies'][encoding],
+                                status=entry['status'])
+        for header, value in entry['headers']:
+            response[header] = value
+        if encoding != 'identity':
+            response['Content-Encoding'] = encoding
+        response['Content-Length'] = len(response.content)
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
+
+
+def wrap_connections(stack, wrapper):
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(wrapper))
+
+
+def finish_response(response, wrapper, finish):
+    """Подводим итоги запроса, когда ответ действительно собран.
+
+    Потоковый ответ выполняет SQL при отдаче тела, когда middleware
+    уже вышла из обёртки: ставим её заново на каждую пачку, а итоги
+    подводим после последней.
+    """
+    if not response.streaming or isinstance(response, FileResponse):
+        finish()
+        return response
+    content = iter(response.streaming_content)
+
+    def stream():
+        try:
+            while True:
+                with ExitStack() as stack:
+                    wrap_connections(stack, wrapper)
+                    chunk = next(content, None)
+                if chunk is None:
+                    return
+                yield chunk
+        finally:
+            finish()
+
+    response.streaming_content = stream()
+    return response
+
+
+class QueryTimer:
+    """Обёртка execute, считающая запросы и их время"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - start
+
+
+class ProfilingMiddleware:
+    """Выборочно профилирует запросы: время, SQL, шаблоны, размер ответа.
+
+    Замеряется доля BLOG_PROFILING_SAMPLE_RATE запросов, остальные
+    проходят без обёрток. Результаты лежат в кольцевом буфере samples.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= settings.BLOG_PROFILING_SAMPLE_RATE:
+            return self.get_response(request)
+        request.profiling = {'template_time': None}
+        timer = QueryTimer()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            wrap_connections(stack, timer)
+            response = self.get_response(request)
+
+        def finish():
+            match = request.resolver_match
+            samples.append({
+                'time': time.time(),
+                'path': request.path,
+                'view_name': match.view_name if match else None,
+                'status': response.status_code,
+                'total_time': time.perf_counter() - start,
+                'sql_count': timer.count,
+                'sql_time': timer.duration,
+                'template_time': request.profiling['template_time'],
+                'response_size': (None if response.streaming
+                                  else len(response.content)),
+            })
+
+        return finish_response(response, timer, finish)
+
+    def process_template_response(self, request, response):
+        profiling = getattr(request, 'profiling', None)
+        if profiling is not None:
+            start = time.perf_counter()
+
+            def stop_timer(response):
+                profiling['template_time'] = time.perf_counter() - start
+
+            response.add_post_render_callback(stop_timer)
+        return response
+
+
+def normalize_sql(sql):
+    """Убираем из SQL всё, что меняется от запроса к запросу"""
+    sql = re.sub(r"'(?:[^']|'')*'", '?', sql)
+    sql = re.sub(r'\b\d+\b', '?', sql)
+    sql = re.sub(r'%s', '?', sql)
+    sql = re.sub(r'\(\s*\?(?:\s*,\s*\?)*\s*\)', '(...)', sql)
+    return re.sub(r'\s+', ' ', sql).strip()
+
+
+def explain_sql(alias, sql, params):
+    """План запроса; считаем только для SELECT"""
+    if not sql.lstrip().upper().startswith('SELECT'):
+        return ''
+    connection = connections[alias]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'{connection.ops.explain_query_prefix()} {sql}', params)
+        return '\n'.join(
+            ' '.join(str(column) for column in row)
+            for row in cursor.fetchall())
+
+
+class SlowQueryRecorder:
+    """Обёртка execute, собирающая запросы дольше порога"""
+
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self.queries = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            if duration >= self.threshold:
+                self.add(sql, params, duration, context['connection'].alias)
+
+    def add(self, sql, params, duration, alias):
+        normalized = normalize_sql(sql)
+        fingerprint = hashlib.md5(normalized.encode()).hexdigest()
+        query = self.queries.setdefault(fingerprint, {
+            'fingerprint': fingerprint, 'sql': normalized, 'count': 0,
+            'total_time': 0.0, 'max_time': 0.0,
+            'explain': lambda: explain_sql(alias, sql, params),
+        })
+        query['count'] += 1
+        query['total_time'] += duration
+        query['max_time'] = max(query['max_time'], duration)
+
+
+class SlowQueryMiddleware:
+    """Пишет в SlowQuery запросы дольше BLOG_SLOW_QUERY_THRESHOLD секунд.
+
+    Запросы копятся за время запроса и сохраняются одним проходом
+    после ответа вместе с именем представления.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        threshold = settings.BLOG_SLOW_QUERY_THRESHOLD
+        if threshold is None:
+            return self.get_response(request)
+        recorder = SlowQueryRecorder(threshold)
+        with ExitStack() as stack:
+            wrap_connections(stack, recorder)
+            response = self.get_response(request)
+        return finish_response(
+            response, recorder, lambda: self.record(request, recorder))
+
+    def record(self, request, recorder):
+        match = request.resolver_match
+        for query in recorder.queries.values():
+            # Журнал не должен ломать уже готовый ответ
+            try:
+                with transaction.atomic():
+                    SlowQuery.objects.record(
+                        view_name=match.view_name if match else '', **query)
+            except Exception:
+                logger.exception('Не удалось записать медленный запрос %s',
+                                 query['sql'])
+
+
+class MetricsMiddleware:
+    """Время ответа и SQL по имени URL для эндпоинта /metrics"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timer = QueryTimer()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            wrap_connections(stack, timer)
+            response = self.get_response(request)
+        return finish_response(
+            response, timer, lambda: self.record(request, timer, start))
+
+    def record(self, request, timer, start):
+        match = request.resolver_match
+        view_name = match.view_name if match else 'unmatched'
+        metrics.observe('blog_request_duration_seconds',
+                        time.perf_counter() - start, view=view_name)
+        metrics.inc('blog_db_queries_total', timer.count, view=view_name)
+        metrics.inc('blog_db_query_seconds_total', timer.duration,
+                    view=view_name)
+        try:
+            metrics.flush()
+        except Exception:
+            logger.exception('Не удалось сбросить метрики')
@@ -0,0 +1,27 @@
+# Generated by Django 3.2.16 on 2026-10-19 09:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0005_alter_post_pub_date'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(max_length=64, unique=True)),
+                ('published', models.IntegerField(default=0)),
+                ('total', models.IntegerField(default=0)),
+                ('due_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'счётчик постов',
+                'verbose_name_plural': 'Счётчики постов',
+            },
+        ),
+    ]
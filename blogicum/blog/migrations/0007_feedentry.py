@@ -0,0 +1,70 @@
+# Generated by Django 3.2.16 on 2026-10-19 09:35
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.utils.text import Truncator
+
+BATCH_SIZE = 1000
+
+
+def fill_feed(apps, schema_editor):
+    """Собираем ленту из уже опубликованных постов"""
+    Post = apps.get_model('blog', 'Post')
+    FeedEntry = apps.get_model('blog', 'FeedEntry')
+    posts = Post.objects.filter(
+        is_published=True, category__is_published=True).select_related(
+            'author', 'category', 'location').annotate(
+                comment_count=models.Count('comments')).order_by('pk')
+    entries = []
+    for post in posts.iterator(chunk_size=BATCH_SIZE):
+        location = post.location
+        entries.append(FeedEntry(
+            post_id=post.pk, pub_date=post.pub_date, title=post.title,
+            excerpt=Truncator(Truncator(post.text).words(
+                10, truncate=' …')).chars(256),
+            image=post.image.name or '',
+            author_id=post.author_id, author_username=post.author.username,
+            category_id=post.category_id, category_slug=post.category.slug,
+            category_title=post.category.title,
+            location_id=post.location_id,
+            location_name=(location.name if location and location.is_published
+                           else None),
+            comment_count=post.comment_count))
+        if len(entries) >= BATCH_SIZE:
+            FeedEntry.objects.bulk_create(entries)
+            entries = []
+    FeedEntry.objects.bulk_create(entries)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0006_postcounter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedEntry',
+            fields=[
+                ('post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='feed_entry', serialize=False, to='blog.post')),
+                ('pub_date', models.DateTimeField(db_index=True)),
+                ('title', models.CharField(max_length=256)),
+                ('excerpt', models.TextField()),
+                ('image', models.CharField(blank=True, max_length=256)),
+                ('author_id', models.BigIntegerField()),
+                ('author_username', models.CharField(max_length=150)),
+                ('category_id', models.BigIntegerField(db_index=True)),
+                ('category_slug', models.SlugField()),
+                ('category_title', models.CharField(max_length=256)),
+                ('location_id', models.BigIntegerField(db_index=True, null=True)),
+                ('location_name', models.CharField(max_length=256, null=True)),
+                ('comment_count', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'запись ленты',
+                'verbose_name_plural': 'Лента',
+                'ordering': ('-pub_date',),
+            },
+        ),
+        migrations.RunPython(fill_feed, migrations.RunPython.noop),
+    ]
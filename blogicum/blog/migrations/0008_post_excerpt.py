@@ -0,0 +1,43 @@
+# Generated by Django 3.2.16 on 2026-10-19 09:38
+
+from django.db import migrations, models
+from django.utils.text import Truncator
+
+BATCH_SIZE = 1000
+
+
+def fill_excerpts(apps, schema_editor):
+    """Отрывки уже написанных постов, как у make_excerpt"""
+    Post = apps.get_model('blog', 'Post')
+    last_pk = 0
+    while True:
+        posts = list(Post.objects.filter(pk__gt=last_pk).order_by(
+            'pk').only('pk', 'text')[:BATCH_SIZE])
+        if not posts:
+            return
+        for post in posts:
+            post.excerpt = Truncator(Truncator(post.text).words(
+                10, truncate=' …')).chars(256)
+        Post.objects.bulk_update(posts, ['excerpt'])
+        last_pk = posts[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0007_feedentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='excerpt',
+            field=models.CharField(blank=True, editable=False, max_length=256, verbose_name='Отрывок для карточки'),
+        ),
+        migrations.AlterField(
+            model_name='feedentry',
+            name='excerpt',
+            field=models.CharField(max_length=256),
+        ),
+        migrations.RunPython(fill_excerpts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 3.2.16 on 2026-10-19 09:39
+
+import blog.fields
+from django.db import migrations
+
+BATCH_SIZE = 1000
+
+
+def fill_text_html(apps, schema_editor):
+    """HTML текстов уже написанных постов и комментариев"""
+    for model_name in ('Post', 'Comment'):
+        model = apps.get_model('blog', model_name)
+        last_pk = 0
+        while True:
+            items = list(model.objects.filter(pk__gt=last_pk).order_by(
+                'pk').only('pk', 'text')[:BATCH_SIZE])
+            if not items:
+                break
+            for item in items:
+                item.text_html = blog.fields.render_text(item.text)
+            model.objects.bulk_update(items, ['text_html'])
+            last_pk = items[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0008_post_excerpt'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='text_html',
+            field=blog.fields.RenderedTextField(source='text', verbose_name='Текст комментария в HTML'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='text_html',
+            field=blog.fields.RenderedTextField(source='text', verbose_name='Текст в HTML'),
+        ),
+        migrations.RunPython(fill_text_html, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 3.2.16 on 2026-10-19 09:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0009_rendered_text'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlowQuery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('view_name', models.CharField(blank=True, max_length=256)),
+                ('fingerprint', models.CharField(max_length=32)),
+                ('sql', models.TextField()),
+                ('explain', models.TextField(blank=True)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('total_time', models.FloatField(default=0)),
+                ('max_time', models.FloatField(default=0)),
+                ('last_seen', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'медленный запрос',
+                'verbose_name_plural': 'Медленные запросы',
+                'unique_together': {('view_name', 'fingerprint')},
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 3.2.16 on 2026-10-19 09:45
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('blog', '0010_slowquery'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthorStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='blog_stats', serialize=False, to='auth.user')),
+                ('comment_count', models.IntegerField(default=0)),
+                ('last_post_date', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'статистика автора',
+                'verbose_name_plural': 'Статистика авторов',
+            },
+        ),
+    ]
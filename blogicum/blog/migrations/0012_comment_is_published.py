@@ -0,0 +1,18 @@
+# Generated by Django 3.2.16 on 2026-10-19 09:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0011_authorstats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='is_published',
+            field=models.BooleanField(default=True, help_text='Снимите галочку, чтобы скрыть комментарий.', verbose_name='Опубликовано'),
+        ),
+    ]
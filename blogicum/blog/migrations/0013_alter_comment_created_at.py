@@ -0,0 +1,18 @@
+# Generated by Django 3.2.16 on 2026-10-19 09:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0012_comment_is_published'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='comment',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+    ]
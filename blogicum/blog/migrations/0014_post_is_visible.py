@@ -0,0 +1,30 @@
+# Generated by Django 3.2.16 on 2026-10-19 09:50
+
+from django.db import migrations, models
+
+
+def fill_is_visible(apps, schema_editor):
+    Post = apps.get_model('blog', 'Post')
+    Post.objects.filter(
+        is_published=True, category__is_published=True).update(
+            is_visible=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0013_alter_comment_created_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='is_visible',
+            field=models.BooleanField(default=False, editable=False, help_text='Пост и его категория опубликованы.', verbose_name='Виден читателям'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['is_visible', 'pub_date'], name='blog_post_visible_pub_date'),
+        ),
+        migrations.RunPython(fill_is_visible, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 3.2.16 on 2026-10-19 10:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0014_post_is_visible'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PublishWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('published_until', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'отметка публикаций',
+                'verbose_name_plural': 'Отметки публикаций',
+            },
+        ),
+    ]
@@ -1,10 +1,47 @@
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.db import models, transaction
+from django.db.models import (Case, Count, Exists, F, Max, Min, OuterRef, Q,
+                              Subquery, When)
+from django.db.models.functions import Coalesce, Greatest, Least
+from django.utils import timezone
+from django.utils.functional import cached_property
+from django.utils.text import Truncator
+
+from . import metrics
+from .fields import RenderedTextField, with_rendered_fields
+from .paths import fast_reverse
+from .reference import locations
 
 MAX_LEN = 256
+EXCERPT_WORDS = 10
 User = get_user_model()
 
 
+def shift_comment_counts(queryset, field, deltas):
+    """Сдвигаем comment_count сразу у всех строк одним UPDATE"""
+    if not deltas:
+        return
+    queryset.filter(**{f'{field}__in': deltas}).update(
+        comment_count=F('comment_count') + Case(
+            *(When(**{field: key}, then=n) for key, n in deltas.items()),
+            default=0, output_field=models.IntegerField()))
+
+
+def published_comment_count(field, outer_field):
+    """Подзапрос: сколько опубликованных комментариев у строки UPDATE"""
+    comments = Comment.objects.filter(
+        **{field: OuterRef(outer_field)}, is_published=True)
+    comments = comments.order_by().values(field).annotate(
+        n=Count('pk')).values('n')
+    return Coalesce(Subquery(comments), 0)
+
+
+def make_excerpt(text):
+    """То же, что фильтр truncatewords:10 в карточке поста"""
+    return Truncator(Truncator(text).words(
+        EXCERPT_WORDS, truncate=' …')).chars(MAX_LEN)
+
+
 class PublishedModel(models.Model):
     """Абстрактная модель. Добавляем флаги is_published и created_at"""
 
@@ -50,6 +87,17 @@ class Location(PublishedModel):
         return self.name
 
 
+class PostQuerySet(models.QuerySet):
+
+    def refresh_visibility(self):
+        """Пересчитываем is_visible одним UPDATE без загрузки постов"""
+        category_published = Category.objects.filter(
+            pk=OuterRef('category_id'), is_published=True)
+        return self.update(is_visible=Case(
+            When(Exists(category_published), is_published=True, then=True),
+            default=False))
+
+
 class Post(PublishedModel):
     """Публикация"""
 
@@ -57,8 +105,9 @@ class Post(PublishedModel):
         max_length=MAX_LEN, verbose_name='Заголовок поста')
     text = models.TextField(verbose_name='Текст')
     pub_date = models.DateTimeField(
-        verbose_name='Дата и время публикации', help_text='Если установить'
-        ' дату и время в будущем — можно делать отложенные публикации.')
+        db_index=True, verbose_name='Дата и время публикации',
+        help_text='Если установить дату и время в будущем — можно делать'
+        ' отложенные публикации.')
     author = models.ForeignKey(
         User, on_delete=models.CASCADE, verbose_name='Автор публикации',
         related_name='blogs')
@@ -69,27 +118,84 @@ class Post(PublishedModel):
         'Category', related_name='blogs', on_delete=models.SET_NULL, null=True,
         verbose_name='Категория')
     image = models.ImageField('Фото', upload_to='post_images', blank=True)
+    excerpt = models.CharField(
+        'Отрывок для карточки', max_length=MAX_LEN, editable=False,
+        blank=True)
+    text_html = RenderedTextField('Текст в HTML')
+    is_visible = models.BooleanField(
+        'Виден читателям', default=False, editable=False,
+        help_text='Пост и его категория опубликованы.')
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'публикация'
         verbose_name_plural = 'Публикации'
         ordering = ['-pub_date', ]
+        indexes = [models.Index(fields=('is_visible', 'pub_date'),
+                                name='blog_post_visible_pub_date')]
 
     def __str__(self):
         return self.title
 
+    def get_absolute_url(self):
+        return fast_reverse('blog:post_detail', self.pk)
+
+    @cached_property
+    def location_display(self):
+        """Название места, если оно опубликовано"""
+        location = locations.get(pk=self.location_id)
+        return location.name if location and location.is_published else None
+
+    def get_author_url(self):
+        return fast_reverse('blog:profile', self.author.username)
+
+    def get_category_url(self):
+        return fast_reverse('blog:category_posts', self.category.slug)
+
+    def category_is_published(self):
+        if self.category_id is None:
+            return False
+        if Post.category.is_cached(self):
+            return self.category.is_published
+        return Category.objects.filter(
+            pk=self.category_id, is_published=True).exists()
+
+    def save(self, *args, **kwargs):
+        self.excerpt = make_excerpt(self.text)
+        self.is_visible = self.is_published and self.category_is_published()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            update_fields = with_rendered_fields(self, update_fields)
+            if 'text' in update_fields:
+                update_fields.add('excerpt')
+            if update_fields & {'is_published', 'category'}:
+                update_fields.add('is_visible')
+            kwargs['update_fields'] = update_fields
+        # Счётчики сдвигают сигналы, запись поста и сдвиг идут вместе
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            return super().delete(*args, **kwargs)
+
 
 class Comment(models.Model):
     """Комменты к постам"""
 
     text = models.TextField('Текст комментария')
+    text_html = RenderedTextField('Текст комментария в HTML')
     post = models.ForeignKey(
         Post, verbose_name='Заголовок поста',
         on_delete=models.CASCADE, related_name='comments',
     )
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     author = models.ForeignKey(User, on_delete=models.CASCADE,
                                related_name='comments')
+    is_published = models.BooleanField(
+        default=True, verbose_name='Опубликовано', help_text='Снимите галочку,'
+        ' чтобы скрыть комментарий.')
 
     class Meta:
         ordering = ('created_at',)
@@ -98,3 +204,317 @@ class Comment(models.Model):
 
     def __str__(self):
         return self.text
+
+    def get_author_url(self):
+        return fast_reverse('blog:profile', self.author.username)
+
+    def get_edit_url(self):
+        return fast_reverse('blog:edit_comment', self.post_id, self.pk)
+
+    def get_delete_url(self):
+        return fast_reverse('blog:delete_comment', self.post_id, self.pk)
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = with_rendered_fields(
+                self, update_fields)
+        super().save(*args, **kwargs)
+
+
+class PostCounterManager(models.Manager):
+
+    @staticmethod
+    def scope_filter(scope):
+        if scope == 'index':
+            return {}
+        kind, pk = scope.split(':')
+        return {f'{kind}_id': int(pk)}
+
+    def refresh(self, *scopes):
+        """Пересчитываем счётчики по таблице постов"""
+        now = timezone.now()
+        visible = Q(is_visible=True)
+        for scope in scopes:
+            values = Post.objects.filter(
+                **self.scope_filter(scope)).aggregate(
+                    total=Count('id'),
+                    published=Count(
+                        'id', filter=visible & Q(pub_date__lte=now)),
+                    due_at=Min(
+                        'pub_date', filter=visible & Q(pub_date__gt=now)))
+            self.update_or_create(scope=scope, defaults=values)
+
+    def get_count(self, scope, visibility='published'):
+        counter = self.filter(scope=scope).first()
+        stale = counter is None or (
+            counter.due_at and counter.due_at <= timezone.now())
+        metrics.cache_hit('post_counter', not stale)
+        if stale:
+            self.refresh(scope)
+            counter = self.get(scope=scope)
+        return getattr(counter, visibility)
+
+    def apply(self, scopes, published=0, total=0, due_at=None):
+        """Сдвигаем уже посчитанные счётчики без пересчёта"""
+        changes = {}
+        if published:
+            changes['published'] = F('published') + published
+        if total:
+            changes['total'] = F('total') + total
+        if due_at:
+            changes['due_at'] = Least(Coalesce('due_at', due_at), due_at)
+        if changes:
+            self.filter(scope__in=scopes).update(**changes)
+
+
+class PostCounter(models.Model):
+    """Число постов в ленте: всего и видимых читателям.
+
+    scope — это 'index', 'category:<id>' или 'author:<id>'.
+    due_at — ближайшая отложенная публикация, после неё published
+    пересчитывается.
+    """
+
+    scope = models.CharField(max_length=64, unique=True)
+    published = models.IntegerField(default=0)
+    total = models.IntegerField(default=0)
+    due_at = models.DateTimeField(null=True, blank=True)
+
+    objects = PostCounterManager()
+
+    class Meta:
+        verbose_name = 'счётчик постов'
+        verbose_name_plural = 'Счётчики постов'
+
+    def __str__(self):
+        return self.scope
+
+
+class PublishWatermarkManager(models.Manager):
+
+    def published_until(self):
+        watermark = self.first()
+        return watermark.published_until if watermark else None
+
+    def advance(self, published_until):
+        self.update_or_create(
+            pk=1, defaults={'published_until': published_until})
+
+
+class PublishWatermark(models.Model):
+    """Докуда publish_scheduled уже объявил наступившие публикации.
+
+    Счётчики сдвигают due_at сами, как только кто-то открыл ленту,
+    поэтому воркер после перезапуска продолжает с этой отметки.
+    """
+
+    published_until = models.DateTimeField()
+
+    objects = PublishWatermarkManager()
+
+    class Meta:
+        verbose_name = 'отметка публикаций'
+        verbose_name_plural = 'Отметки публикаций'
+
+    def __str__(self):
+        return str(self.published_until)
+
+
+class FeedEntryManager(models.Manager):
+
+    def visible(self):
+        return self.filter(pub_date__lte=timezone.now())
+
+    def recount_comments(self):
+        return self.update(comment_count=published_comment_count(
+            'post_id', 'post_id'))
+
+    def refresh(self, post_ids):
+        """Перестраиваем записи ленты для переданных постов"""
+        post_ids = list(post_ids)
+        posts = Post.objects.filter(
+            pk__in=post_ids, is_visible=True).select_related(
+                'author', 'category').annotate(
+                    comment_count=Count('comments', filter=Q(
+                        comments__is_published=True)))
+        entries = [FeedEntry.from_post(post) for post in posts]
+        self.filter(post_id__in=post_ids).delete()
+        self.bulk_create(entries)
+
+
+class FeedEntry(models.Model):
+    """Готовая карточка поста для главной ленты.
+
+    В таблице лежат опубликованные посты опубликованных категорий,
+    в том числе отложенные: они попадают в ленту, как только
+    pub_date становится меньше текущего времени.
+    """
+
+    post = models.OneToOneField(
+        Post, primary_key=True, on_delete=models.CASCADE,
+        related_name='feed_entry')
+    pub_date = models.DateTimeField(db_index=True)
+    title = models.CharField(max_length=MAX_LEN)
+    excerpt = models.CharField(max_length=MAX_LEN)
+    image = models.CharField(max_length=MAX_LEN, blank=True)
+    author_id = models.BigIntegerField()
+    author_username = models.CharField(max_length=150)
+    category_id = models.BigIntegerField(db_index=True)
+    category_slug = models.SlugField()
+    category_title = models.CharField(max_length=MAX_LEN)
+    location_id = models.BigIntegerField(null=True, db_index=True)
+    location_name = models.CharField(max_length=MAX_LEN, null=True)
+    comment_count = models.IntegerField(default=0)
+
+    objects = FeedEntryManager()
+
+    class Meta:
+        ordering = ('-pub_date',)
+        verbose_name = 'запись ленты'
+        verbose_name_plural = 'Лента'
+
+    def __str__(self):
+        return self.title
+
+    @classmethod
+    def from_post(cls, post):
+        return cls(
+            post_id=post.id, pub_date=post.pub_date, title=post.title,
+            excerpt=post.excerpt,
+            image=post.image.name or '',
+            author_id=post.author_id, author_username=post.author.username,
+            category_id=post.category_id, category_slug=post.category.slug,
+            category_title=post.category.title,
+            location_id=post.location_id,
+            location_name=post.location_display,
+            comment_count=post.comment_count)
+
+    def as_post(self):
+        """Пост для шаблонов карточки без запросов к базе"""
+        post = Post(
+            id=self.post_id, title=self.title, excerpt=self.excerpt,
+            pub_date=self.pub_date, image=self.image, is_published=True,
+            author_id=self.author_id, category_id=self.category_id,
+            location_id=self.location_id)
+        post._state.adding = False
+        post.author = User(id=self.author_id, username=self.author_username)
+        post.category = Category(
+            id=self.category_id, slug=self.category_slug,
+            title=self.category_title, is_published=True)
+        post.location_display = self.location_name
+        post.comment_count = self.comment_count
+        return post
+
+
+class SlowQueryManager(models.Manager):
+
+    def record(self, view_name, fingerprint, sql, count, total_time,
+               max_time, explain):
+        """Добавляем замер к агрегату; EXPLAIN считаем только для новых"""
+        updated = self.filter(
+            view_name=view_name, fingerprint=fingerprint).update(
+                count=F('count') + count,
+                total_time=F('total_time') + total_time,
+                max_time=Greatest('max_time', max_time),
+                last_seen=timezone.now())
+        if not updated:
+            self.create(
+                view_name=view_name, fingerprint=fingerprint, sql=sql,
+                count=count, total_time=total_time, max_time=max_time,
+                explain=explain())
+
+
+class SlowQuery(models.Model):
+    """Медленный SQL-запрос и представление, которое его выполняет"""
+
+    view_name = models.CharField(max_length=MAX_LEN, blank=True)
+    fingerprint = models.CharField(max_length=32)
+    sql = models.TextField()
+    explain = models.TextField(blank=True)
+    count = models.PositiveIntegerField(default=0)
+    total_time = models.FloatField(default=0)
+    max_time = models.FloatField(default=0)
+    last_seen = models.DateTimeField(auto_now=True)
+
+    objects = SlowQueryManager()
+
+    class Meta:
+        verbose_name = 'медленный запрос'
+        verbose_name_plural = 'Медленные запросы'
+        unique_together = ('view_name', 'fingerprint')
+
+    def __str__(self):
+        return f'{self.view_name}: {self.sql[:50]}'
+
+
+class AuthorStatsManager(models.Manager):
+
+    @staticmethod
+    def published_posts(author_id):
+        """Посты автора, которые уже видят читатели"""
+        return Post.objects.filter(author_id=author_id, is_visible=True,
+                                   pub_date__lte=timezone.now())
+
+    def refresh(self, user_id):
+        """Пересчитываем статистику автора по постам и комментариям"""
+        if not User.objects.filter(pk=user_id).exists():
+            # Пользователя уже удалили: сохранять статистику не к чему
+            return self.model(user_id=user_id)
+        stats, _ = self.update_or_create(user_id=user_id, defaults={
+            'comment_count': Comment.objects.filter(
+                author_id=user_id, is_published=True).count(),
+            'last_post_date': self.published_posts(user_id).aggregate(
+                last=Max('pub_date'))['last'],
+        })
+        return stats
+
+    def refresh_last_post_date(self, user_ids):
+        """Пересчитываем дату последней публикации одним UPDATE"""
+        last = self.published_posts(OuterRef('user_id')).order_by(
+            '-pub_date').values('pub_date')[:1]
+        self.filter(user_id__in=user_ids).update(
+            last_post_date=Subquery(last))
+
+    def recount_comments(self):
+        return self.update(comment_count=published_comment_count(
+            'author_id', 'user_id'))
+
+    def for_user(self, user_id):
+        stats = self.filter(user_id=user_id).first()
+        return stats if stats is not None else self.refresh(user_id)
+
+    def add_comments(self, user_id, delta):
+        self.filter(user_id=user_id).update(
+            comment_count=F('comment_count') + delta)
+
+
+class AuthorStats(models.Model):
+    """Статистика автора для шапки профиля.
+
+    Число постов берётся из счётчика PostCounter автора.
+    """
+
+    user = models.OneToOneField(
+        User, primary_key=True, on_delete=models.CASCADE,
+        related_name='blog_stats')
+    comment_count = models.IntegerField(default=0)
+    last_post_date = models.DateTimeField(null=True, blank=True)
+
+    objects = AuthorStatsManager()
+
+    class Meta:
+        verbose_name = 'статистика автора'
+        verbose_name_plural = 'Статистика авторов'
+
+    def __str__(self):
+        return str(self.user_id)
+
+    @cached_property
+    def post_count(self):
+        return PostCounter.objects.get_count(f'author:{self.user_id}',
+                                             'total')
+
+    @cached_property
+    def published_count(self):
+        return PostCounter.objects.get_count(f'author:{self.user_id}')
@@ -0,0 +1,68 @@
+# Массовая модерация комментариев. Комментарии скрываются и удаляются
+# пачками по первичному ключу одним UPDATE/DELETE на пачку, без загрузки
+# строк в Python; счётчики ленты и авторов правятся той же пачкой.
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+
+from . import metrics, pagecache
+from .models import AuthorStats, Comment, FeedEntry, shift_comment_counts
+from .signals import reset_profile_headers
+
+ACTIONS = ('hide', 'delete')
+
+
+def select_comments(author=None, post=None, since=None, until=None):
+    """Комментарии автора, поста и/или за период"""
+    comments = Comment.objects.all()
+    if author is not None:
+        comments = comments.filter(author=author)
+    if post is not None:
+        comments = comments.filter(post=post)
+    if since is not None:
+        comments = comments.filter(created_at__gte=since)
+    if until is not None:
+        comments = comments.filter(created_at__lt=until)
+    return comments
+
+
+def count_by(comments, field):
+    return dict(comments.order_by().values_list(field).annotate(
+        n=Count('pk')))
+
+
+def moderate_comments(comments, action, chunk_size=None):
+    """Скрываем или удаляем комментарии; возвращаем их число"""
+    if action not in ACTIONS:
+        raise ValueError(f'Неизвестное действие: {action}')
+    chunk_size = chunk_size or settings.BLOG_MODERATION_CHUNK_SIZE
+    if action == 'hide':
+        comments = comments.filter(is_published=True)
+    comments = comments.order_by('pk')
+    done = 0
+    last_pk = 0
+    while True:
+        pks = list(comments.filter(pk__gt=last_pk).values_list(
+            'pk', flat=True)[:chunk_size])
+        if not pks:
+            return done
+        last_pk = pks[-1]
+        chunk = Comment.objects.filter(pk__in=pks)
+        with transaction.atomic():
+            visible = chunk.filter(is_published=True)
+            by_post = count_by(visible, 'post_id')
+            by_author = count_by(visible, 'author_id')
+            if action == 'hide':
+                chunk.update(is_published=False)
+            else:
+                # Обычный delete() отправил бы сигналы для каждой строки
+                chunk._raw_delete(chunk.db)
+            shift_comment_counts(FeedEntry.objects, 'post_id', {
+                post_id: -n for post_id, n in by_post.items()})
+            shift_comment_counts(AuthorStats.objects, 'user_id', {
+                author_id: -n for author_id, n in by_author.items()})
+        reset_profile_headers(by_author)
+        pagecache.invalidate()
+        metrics.inc('blog_writes_total', len(pks), model='comment',
+                    action='deleted' if action == 'delete' else 'updated')
+        done += len(pks)
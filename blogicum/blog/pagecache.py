@@ -0,0 +1,62 @@
+# Кэш целых страниц ленты для анонимных читателей. Страница сжимается
+# один раз, при записи в кэш: запись хранит тело без сжатия и его копии
+# gzip и br, а ответ собирается из готовой копии по Accept-Encoding.
+# Любое изменение в блоге меняет номер версии, и старые страницы больше
+# не читаются, дальше их вытесняет таймаут.
+import gzip
+import hashlib
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+VERSION_KEY = 'blog:pages:version'
+# Сжатия в порядке предпочтения
+ENCODINGS = ('br', 'gzip')
+# Короче этого сжатие не окупает заголовков
+MIN_COMPRESS_SIZE = 200
+# Заголовки, которые пересчитываются для каждого ответа
+SKIP_HEADERS = {'content-length', 'content-encoding'}
+
+
+def version():
+    current = cache.get(VERSION_KEY)
+    if current is None:
+        cache.add(VERSION_KEY, uuid4().hex, None)
+        current = cache.get(VERSION_KEY)
+    return current
+
+
+def invalidate():
+    cache.set(VERSION_KEY, uuid4().hex, None)
+
+
+def page_key(request):
+    url = hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+    return f'blog:page:{version()}:{url}'
+
+
+def compress(body):
+    """Тело страницы и его сжатые копии по названию сжатия"""
+    bodies = {'identity': body}
+    if len(body) >= MIN_COMPRESS_SIZE:
+        bodies['gzip'] = gzip.compress(body, compresslevel=9, mtime=0)
+        if brotli is not None:
+            bodies['br'] = brotli.compress(body)
+    return bodies
+
+
+def store(key, response):
+    entry = {
+        'status': response.status_code,
+        'headers': [(header, value) for header, value in response.items()
+                    if header.lower() not in SKIP_HEADERS],
+        'bodies': compress(response.content),
+    }
+    cache.set(key, entry, settings.BLOG_PAGE_CACHE_TIMEOUT)
+    return entry
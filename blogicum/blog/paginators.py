@@ -0,0 +1,72 @@
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Max
+from django.utils.functional import cached_property
+
+
+class CachedCountPaginator(Paginator):
+    """Пагинатор, который не считает COUNT(*) на каждый запрос.
+
+    Общее число объектов берётся из таблицы PostCounter по ключу
+    ``count_scope``; счётчики поддерживаются сигналами при записи.
+    """
+
+    def __init__(self, object_list, per_page, count_scope=None,
+                 count_visibility='published', **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.count_scope = count_scope
+        self.count_visibility = count_visibility
+
+    @cached_property
+    def count(self):
+        if self.count_scope is None:
+            return super().count
+        from .models import PostCounter
+
+        return PostCounter.objects.get_count(self.count_scope,
+                                             self.count_visibility)
+
+
+def estimate_count(queryset):
+    """Приблизительное число строк во всей таблице"""
+    from .models import Post, PostCounter
+
+    model = queryset.model
+    if model is Post:
+        return PostCounter.objects.get_count('index', 'total')
+    connection = connections[queryset.db]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                'SELECT reltuples FROM pg_class WHERE relname = %s', [table])
+        elif connection.vendor == 'mysql':
+            cursor.execute(
+                'SELECT table_rows FROM information_schema.tables'
+                ' WHERE table_schema = DATABASE() AND table_name = %s',
+                [table])
+        else:
+            # Последний первичный ключ — верхняя оценка числа строк
+            return queryset.aggregate(last=Max('pk'))['last'] or 0
+        row = cursor.fetchone()
+    return int(row[0]) if row and row[0] is not None and row[0] >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """Пагинатор для админки без COUNT(*) по большим таблицам.
+
+    Число строк во всей таблице от ``BLOG_ADMIN_COUNT_LIMIT`` и больше
+    оценивается. Отфильтрованный список считается точно: фильтры админки
+    идут по индексам, а урезанное число отрезало бы дальние страницы.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimate_count(queryset)
+            if estimate is not None and (
+                    estimate >= settings.BLOG_ADMIN_COUNT_LIMIT):
+                return estimate
+        return queryset.order_by().count()
@@ -0,0 +1,39 @@
+# Короткая карточка пользователя для страницы профиля в общем кэше,
+# чтобы профиль открывался без запроса к auth_user.
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+from . import metrics
+from .models import User
+
+# from_db() ждёт значения в порядке полей модели
+SUMMARY_FIELDS = tuple(
+    field.attname for field in User._meta.concrete_fields
+    if field.attname in {'id', 'username', 'first_name', 'last_name',
+                         'date_joined', 'is_staff'})
+
+
+def summary_key(username):
+    digest = hashlib.md5(username.encode('utf-8')).hexdigest()
+    return f'blog:user_summary:{digest}'
+
+
+def get_profile(username):
+    """Пользователь по имени или None; прочие поля загрузятся лениво"""
+    key = summary_key(username)
+    summary = cache.get(key)
+    metrics.cache_hit('user_summary', summary is not None)
+    if summary is None:
+        summary = User.objects.filter(username=username).values_list(
+            *SUMMARY_FIELDS).first()
+        if summary is None:
+            return None
+        cache.set(key, summary, settings.BLOG_USER_SUMMARY_TIMEOUT)
+    return User.from_db(DEFAULT_DB_ALIAS, SUMMARY_FIELDS, summary)
+
+
+def forget_profiles(usernames):
+    cache.delete_many([summary_key(username) for username in usernames])
@@ -0,0 +1,38 @@
+# Ограничение частоты действий пользователя: «ведро с жетонами» в общем
+# кэше, поэтому лимит общий для всех процессов. Чтение и запись ведра не
+# атомарны: при гонке пользователь может получить лишний жетон.
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+class TokenBucket:
+    """Не больше ``capacity`` действий подряд, дальше ``rate`` в секунду"""
+
+    def __init__(self, name, capacity_setting, rate_setting):
+        self.name = name
+        self.capacity_setting = capacity_setting
+        self.rate_setting = rate_setting
+
+    def take(self, key, cost=1):
+        """Через сколько секунд можно повторить; 0 — действие разрешено"""
+        capacity = getattr(settings, self.capacity_setting)
+        rate = getattr(settings, self.rate_setting)
+        cache_key = f'blog:ratelimit:{self.name}:{key}'
+        now = time.time()
+        tokens, updated_at = cache.get(cache_key, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated_at) * rate)
+        retry_after = 0
+        if tokens >= cost:
+            tokens -= cost
+        else:
+            retry_after = math.ceil((cost - tokens) / rate)
+        cache.set(cache_key, (tokens, now),
+                  math.ceil((capacity - tokens) / rate) + 1)
+        return retry_after
+
+
+comment_bucket = TokenBucket(
+    'comment', 'BLOG_COMMENT_BURST', 'BLOG_COMMENT_RATE')
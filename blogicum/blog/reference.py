@@ -0,0 +1,85 @@
+# Категории и местоположения в памяти процесса. Таблицы маленькие и
+# меняются редко, поэтому процесс держит их целиком и перечитывает, когда
+# номер версии в общем кэше перестаёт совпадать с его собственным. Для
+# этого кэш default должен быть общим для всех процессов; без него копию
+# обновляют только промах в get() и срок BLOG_REFERENCE_TTL.
+import time
+from collections import namedtuple
+from uuid import uuid4
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+
+from . import metrics
+
+# Копия таблицы целиком: её заменяют одним присваиванием, поэтому
+# другие потоки видят либо старую копию, либо новую
+Snapshot = namedtuple('Snapshot', 'version checked_at loaded_at index')
+
+
+class ReferenceTable:
+    """Все строки модели с индексами по pk и дополнительным полям.
+
+    Возвращаемые объекты общие для всех запросов процесса,
+    менять их нельзя.
+    """
+
+    def __init__(self, model_name, *fields):
+        self.model_name = model_name
+        self.fields = ('pk', *fields)
+        self.version_key = f'blog:reference:{model_name.lower()}'
+        self.reset()
+
+    def reset(self):
+        self.snapshot = Snapshot(None, 0.0, 0.0, {})
+
+    def shared_version(self):
+        version = cache.get(self.version_key)
+        if version is None:
+            cache.add(self.version_key, uuid4().hex, None)
+            version = cache.get(self.version_key)
+        return version
+
+    def load(self, version, now):
+        rows = list(apps.get_model('blog', self.model_name).objects.all())
+        return Snapshot(version, now, now, {
+            field: {getattr(row, field): row for row in rows}
+            for field in self.fields})
+
+    def rows(self, reload=False):
+        snapshot = self.snapshot
+        now = time.monotonic()
+        interval = settings.BLOG_REFERENCE_CHECK_INTERVAL
+        if not reload and snapshot.version is not None and (
+                now - snapshot.checked_at < interval):
+            return snapshot.index
+        # Версию читаем до строк: запись после чтения сменит версию ещё раз
+        version = self.shared_version()
+        fresh = not reload and version == snapshot.version and (
+            now - snapshot.loaded_at < settings.BLOG_REFERENCE_TTL)
+        metrics.cache_hit(f'reference_{self.model_name.lower()}', fresh)
+        if fresh:
+            snapshot = snapshot._replace(checked_at=now)
+        else:
+            snapshot = self.load(version, now)
+        self.snapshot = snapshot
+        return snapshot.index
+
+    def get(self, **lookup):
+        (field, value), = lookup.items()
+        row = self.rows()[field].get(value)
+        if row is None and value is not None and (
+                time.monotonic() - self.snapshot.loaded_at
+                >= settings.BLOG_REFERENCE_CHECK_INTERVAL):
+            # Строку могли добавить в процессе, чей кэш нам не виден
+            row = self.rows(reload=True)[field].get(value)
+        return row
+
+    def invalidate(self):
+        cache.set(self.version_key, uuid4().hex, None)
+        self.reset()
+
+
+categories = ReferenceTable('Category', 'slug')
+locations = ReferenceTable('Location')
@@ -0,0 +1,354 @@
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import Signal, receiver
+from django.utils import timezone
+
+from . import metrics, pagecache
+from .models import (AuthorStats, Category, Comment, FeedEntry, Location,
+                     Post, PostCounter, User)
+from .profiles import forget_profiles
+from .reference import categories, locations
+
+# Отложенные посты стали видны читателям: sender=Post, post_ids=[...]
+post_became_visible = Signal()
+
+
+# Шапки профиля в шаблонах Django и Jinja2, см. blog/profile.html
+PROFILE_HEADER_FRAGMENTS = ('profile_header', 'profile_header_jinja2')
+
+
+def reset_profile_headers(user_ids):
+    """Сбрасываем закэшированные шапки профилей"""
+    cache.delete_many([
+        make_template_fragment_key(fragment, [user_id, is_owner])
+        for fragment in PROFILE_HEADER_FRAGMENTS
+        for user_id in user_ids for is_owner in (True, False)])
+
+
+def post_scopes(category_id, author_id):
+    return ('index', f'category:{category_id}', f'author:{author_id}')
+
+
+def post_contribution(category_id, author_id, is_visible, pub_date):
+    """Во что пост превращается в счётчиках: области и видимость"""
+    return {
+        'scopes': post_scopes(category_id, author_id),
+        'published': int(is_visible and pub_date <= timezone.now()),
+        'due_at': (pub_date if is_visible and pub_date > timezone.now()
+                   else None),
+    }
+
+
+def apply_contribution(contribution, sign):
+    PostCounter.objects.apply(
+        contribution['scopes'], published=sign * contribution['published'],
+        total=sign, due_at=contribution['due_at'] if sign > 0 else None)
+
+
+@receiver(pre_save, sender=Post)
+def remember_post_state(sender, instance, **kwargs):
+    """Запоминаем, как пост учтён в счётчиках до сохранения"""
+    if kwargs.get('raw'):
+        return
+    instance._old_contribution = None
+    instance._old_author_id = None
+    if instance.pk is not None:
+        old = sender.objects.filter(pk=instance.pk).values(
+            'category_id', 'author_id', 'is_visible', 'pub_date').first()
+        if old:
+            instance._old_contribution = post_contribution(**old)
+            instance._old_author_id = old['author_id']
+
+
+@receiver(post_save, sender=Post)
+def count_saved_post(sender, instance, **kwargs):
+    """Выполняется в транзакции Post.save() вместе с записью поста"""
+    if kwargs.get('raw'):
+        return
+    old = getattr(instance, '_old_contribution', None)
+    if old is not None:
+        apply_contribution(old, -1)
+    apply_contribution(post_contribution(
+        instance.category_id, instance.author_id,
+        instance.is_visible, instance.pub_date), 1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    apply_contribution(post_contribution(
+        instance.category_id, instance.author_id,
+        instance.is_visible, instance.pub_date), -1)
+
+
+@receiver(pre_save, sender=Category)
+def remember_category_state(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    instance._publish_toggled = instance.pk is not None and (
+        sender.objects.filter(pk=instance.pk).exclude(
+            is_published=instance.is_published).exists())
+
+
+@receiver(post_save, sender=Category)
+def refresh_category_visibility(sender, instance, created, **kwargs):
+    """Должен выполниться до пересчёта счётчиков и ленты"""
+    if kwargs.get('raw'):
+        return
+    if not created and instance._publish_toggled:
+        Post.objects.filter(category_id=instance.pk).refresh_visibility()
+
+
+@receiver(pre_delete, sender=Category)
+def hide_category_posts(sender, instance, **kwargs):
+    Post.objects.filter(category_id=instance.pk).update(is_visible=False)
+
+
+@receiver(pre_delete, sender=Category)
+def remember_category_authors(sender, instance, **kwargs):
+    """После удаления категории у постов будет NULL, авторов не найти"""
+    instance._author_ids = list(
+        Post.objects.filter(category_id=instance.pk).values_list(
+            'author_id', flat=True).distinct())
+
+
+def recount_category(category_id, author_ids):
+    with transaction.atomic():
+        PostCounter.objects.refresh(
+            'index', f'category:{category_id}',
+            *(f'author:{author_id}' for author_id in author_ids))
+        AuthorStats.objects.refresh_last_post_date(author_ids)
+    reset_profile_headers(author_ids)
+
+
+@receiver(post_save, sender=Category)
+def recount_toggled_category(sender, instance, created, **kwargs):
+    """Публикация категории меняет ленту, её страницу и профили авторов"""
+    if kwargs.get('raw') or created or not instance._publish_toggled:
+        return
+    author_ids = Post.objects.filter(category_id=instance.pk).values_list(
+        'author_id', flat=True).distinct()
+    recount_category(instance.pk, author_ids)
+
+
+@receiver(post_delete, sender=Category)
+def recount_deleted_category(sender, instance, **kwargs):
+    recount_category(instance.pk, instance._author_ids)
+
+
+@receiver(post_save, sender=Post)
+def refresh_post_feed_entry(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    FeedEntry.objects.refresh([instance.pk])
+
+
+@receiver(post_save, sender=Category)
+def refresh_category_feed_entries(sender, instance, created, **kwargs):
+    if kwargs.get('raw') or created:
+        return
+    entries = FeedEntry.objects.filter(category_id=instance.pk)
+    if instance._publish_toggled:
+        if instance.is_published:
+            FeedEntry.objects.refresh(Post.objects.filter(
+                category_id=instance.pk).values_list('pk', flat=True))
+        else:
+            entries.delete()
+    else:
+        entries.update(category_slug=instance.slug,
+                       category_title=instance.title)
+
+
+@receiver(pre_delete, sender=Category)
+def drop_category_feed_entries(sender, instance, **kwargs):
+    FeedEntry.objects.filter(category_id=instance.pk).delete()
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Location)
+@receiver(post_delete, sender=Location)
+def invalidate_reference_table(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    table = categories if sender is Category else locations
+    table.invalidate()
+    # Процессы могли перечитать таблицу до фиксации транзакции
+    transaction.on_commit(table.invalidate)
+
+
+@receiver(post_save, sender=Location)
+def refresh_location_feed_entries(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    FeedEntry.objects.filter(location_id=instance.pk).update(
+        location_name=instance.name if instance.is_published else None)
+
+
+@receiver(pre_delete, sender=Location)
+def drop_location_from_feed(sender, instance, **kwargs):
+    FeedEntry.objects.filter(location_id=instance.pk).update(
+        location_id=None, location_name=None)
+
+
+@receiver(post_save, sender=User)
+def refresh_author_feed_entries(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    FeedEntry.objects.filter(author_id=instance.pk).exclude(
+        author_username=instance.username).update(
+            author_username=instance.username)
+
+
+@receiver(pre_save, sender=Comment)
+def remember_comment_state(sender, instance, **kwargs):
+    """Скрытые комментарии не входят в счётчики"""
+    if kwargs.get('raw'):
+        return
+    instance._was_published = instance.pk is not None and (
+        sender.objects.filter(pk=instance.pk, is_published=True).exists())
+
+
+def comment_delta(instance):
+    # blog.ingest обновляет счётчики новых комментариев сам, пачкой
+    if getattr(instance, '_coalesce_counts', False):
+        return 0
+    return int(instance.is_published) - int(
+        getattr(instance, '_was_published', False))
+
+
+@receiver(post_save, sender=Comment)
+def count_feed_comment(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    delta = comment_delta(instance)
+    if delta:
+        FeedEntry.objects.filter(post_id=instance.post_id).update(
+            comment_count=F('comment_count') + delta)
+
+
+@receiver(post_delete, sender=Comment)
+def uncount_feed_comment(sender, instance, **kwargs):
+    if instance.is_published:
+        FeedEntry.objects.filter(post_id=instance.post_id).update(
+            comment_count=F('comment_count') - 1)
+
+
+@receiver(post_became_visible)
+def refresh_due_posts(sender, post_ids, **kwargs):
+    """Пересчитываем счётчики и ленту для наступивших публикаций"""
+    scopes = {'index'}
+    author_ids = set()
+    for category_id, author_id in Post.objects.filter(
+            pk__in=post_ids).values_list('category_id', 'author_id'):
+        scopes.update(post_scopes(category_id, author_id))
+        author_ids.add(author_id)
+    with transaction.atomic():
+        PostCounter.objects.refresh(*sorted(scopes))
+        FeedEntry.objects.refresh(post_ids)
+        AuthorStats.objects.refresh_last_post_date(author_ids)
+    reset_profile_headers(author_ids)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_save, sender=Comment)
+def count_write(sender, instance, created, **kwargs):
+    if kwargs.get('raw'):
+        return
+    metrics.inc('blog_writes_total', model=sender._meta.model_name,
+                action='created' if created else 'updated')
+
+
+@receiver(post_delete, sender=Post)
+@receiver(post_delete, sender=Comment)
+def count_delete(sender, instance, **kwargs):
+    metrics.inc('blog_writes_total', model=sender._meta.model_name,
+                action='deleted')
+
+
+@receiver(post_save, sender=Post)
+def update_author_post_stats(sender, instance, created, **kwargs):
+    if kwargs.get('raw'):
+        return
+    author_ids = {instance.author_id,
+                  getattr(instance, '_old_author_id', None)} - {None}
+    AuthorStats.objects.refresh_last_post_date(author_ids)
+    reset_profile_headers(author_ids)
+
+
+@receiver(post_delete, sender=Post)
+def refresh_author_post_stats(sender, instance, **kwargs):
+    if AuthorStats.objects.filter(user_id=instance.author_id).exists():
+        AuthorStats.objects.refresh(instance.author_id)
+    reset_profile_headers([instance.author_id])
+
+
+@receiver(post_save, sender=Comment)
+def count_author_comment(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    delta = comment_delta(instance)
+    if delta:
+        AuthorStats.objects.add_comments(instance.author_id, delta)
+        reset_profile_headers([instance.author_id])
+
+
+@receiver(post_delete, sender=Comment)
+def uncount_author_comment(sender, instance, **kwargs):
+    if instance.is_published:
+        AuthorStats.objects.add_comments(instance.author_id, -1)
+        reset_profile_headers([instance.author_id])
+
+
+@receiver(pre_save, sender=User)
+def remember_username(sender, instance, update_fields=None, **kwargs):
+    """Имя могло смениться где угодно, хоть в админке"""
+    instance._old_username = None
+    if kwargs.get('raw') or instance.pk is None or (
+            update_fields is not None and 'username' not in update_fields):
+        return
+    instance._old_username = sender.objects.filter(
+        pk=instance.pk).values_list('username', flat=True).first()
+
+
+@receiver(post_save, sender=User)
+def reset_user_profile_header(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    reset_profile_headers([instance.pk])
+    forget_profiles({instance.username,
+                     getattr(instance, '_old_username', None)} - {None})
+
+
+@receiver(post_delete, sender=User)
+def forget_deleted_user(sender, instance, **kwargs):
+    reset_profile_headers([instance.pk])
+    forget_profiles([instance.username])
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Location)
+@receiver(post_delete, sender=Location)
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+@receiver(post_became_visible)
+def invalidate_pages(sender, instance=None, update_fields=None, **kwargs):
+    """Страницы из кэша blog.pagecache устаревают при любой записи"""
+    if kwargs.get('raw'):
+        return
+    # Вход пользователя меняет только last_login, страниц он не касается
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        return
+    # Новые комментарии из blog.ingest сбросят кэш вместе со счётчиками
+    if getattr(instance, '_coalesce_counts', False):
+        return
+    pagecache.invalidate()
+    transaction.on_commit(pagecache.invalidate)
@@ -0,0 +1,16 @@
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+
+class BlogStaticFilesStorage(ManifestStaticFilesStorage):
+    """Имена с хэшем из манифеста build_static.
+
+    Пока статика не собрана, ссылки ведут на файлы без хэша.
+    """
+
+    manifest_strict = False
+
+    def hashed_name(self, name, content=None, filename=None):
+        try:
+            return super().hashed_name(name, content, filename)
+        except ValueError:
+            return name
@@ -0,0 +1,26 @@
+from django import template
+from django.conf import settings
+
+from blog.paths import fast_reverse
+
+register = template.Library()
+
+
+@register.simple_tag
+def page_window(page_obj, on_each_side=None, on_ends=None):
+    """Номера страниц вокруг текущей, остальные свёрнуты в многоточие.
+
+    Размер вывода не зависит от общего числа страниц.
+    """
+    if on_each_side is None:
+        on_each_side = settings.BLOG_PAGINATOR_WINDOW
+    if on_ends is None:
+        on_ends = settings.BLOG_PAGINATOR_ENDS
+    return page_obj.paginator.get_elided_page_range(
+        page_obj.number, on_each_side=on_each_side, on_ends=on_ends)
+
+
+@register.simple_tag
+def fast_url(view_name, *args):
+    """Как {% url %}, но адрес собирается из закэшированных кусков"""
+    return fast_reverse(view_name, *args)
@@ -28,4 +28,10 @@ urlpatterns = [
          views.ProfileListView.as_view(), name='profile'),
     path('edit_profile/',
          views.ProfileUpdateView.as_view(), name='edit_profile'),
+
+    path('moderation/comments/', views.moderate_comments,
+         name='moderate_comments'),
+    path('import/posts/', views.import_posts, name='import_posts'),
+    path('profiling/', views.profiling, name='profiling'),
+    path('metrics', views.metrics, name='metrics'),
 ]
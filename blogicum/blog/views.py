@@ -1,32 +1,57 @@
+from itertools import islice
+from uuid import uuid4
+
+from django.conf import settings
 from django.http.response import HttpResponse
 from django.shortcuts import render, get_object_or_404, redirect
 from django.utils import timezone
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
+from django.views.decorators.http import require_POST
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.contrib.auth.models import User
 from django.views.generic import (DetailView, CreateView, DeleteView, ListView,
                                   UpdateView)
 from django.urls import reverse_lazy, reverse
-from django.db.models import Count
-from django.http import Http404
-
-from blog.models import Category, Post, Comment
-from .forms import CommentForm, PostForm, ProfileForm
+from django.db.models import Count, Q
+from django.utils.functional import SimpleLazyObject
+from django.http import (Http404, HttpResponseForbidden, JsonResponse,
+                         StreamingHttpResponse)
+from django.template.loader import get_template, render_to_string
+
+from blog import metrics as blog_metrics
+from blog.models import AuthorStats, Comment, FeedEntry, Post
+from . import ingest, moderation
+from .forms import (CommentForm, CommentModerationForm, PostForm,
+                    ProfileForm)
+from .importer import PostImporter
+from .middleware import samples
+from .paginators import CachedCountPaginator
+from .profiles import get_profile
+from .ratelimit import comment_bucket
+from .reference import categories
 
 
 POSTS_QNT = 10
-
-
-def base_function(add_filter=False, add_count_comment=False):
-    features = Post.objects.select_related('category', 'author',
-                                           'location')
+# Поля, которые выводит карточка поста includes/post_card.html
+# Категорию и место карточка берёт из blog.reference, без JOIN
+CARD_FIELDS = ('title', 'excerpt', 'pub_date', 'image', 'is_published',
+               'author__username', 'category', 'location')
+
+
+def base_function(add_filter=False, add_count_comment=False,
+                  card_fields=False):
+    features = Post.objects.select_related('author')
+    if card_fields:
+        features = features.only(*CARD_FIELDS)
+    else:
+        features = features.select_related('category', 'location')
     if add_filter:
-        features = features.filter(is_published=True,
-                                   category__is_published=True,
+        features = features.filter(is_visible=True,
                                    pub_date__lte=timezone.now())
     if add_count_comment:
         features = features.annotate(
-            comment_count=Count('comments')).order_by('-pub_date')
+            comment_count=Count('comments', filter=Q(
+                comments__is_published=True))).order_by('-pub_date')
     return features
 
 
@@ -46,7 +71,58 @@ class PostMixin:
         return reverse('blog:profile', args=[self.request.user.username])
 
 
-class ProfileListView(ListView):
+class Jinja2Mixin:
+    """Рендерим через Jinja2, если представление указано в настройках"""
+
+    @property
+    def template_engine(self):
+        view_name = self.request.resolver_match.view_name
+        if view_name in settings.BLOG_JINJA2_VIEWS:
+            return 'jinja2'
+        return None
+
+
+class PostCountMixin:
+    """Ленты с закэшированным общим числом постов"""
+
+    paginator_class = CachedCountPaginator
+    count_visibility = 'published'
+
+    def get_count_scope(self):
+        return None
+
+    def get_paginator(self, queryset, per_page, orphans=0,
+                      allow_empty_first_page=True, **kwargs):
+        return super().get_paginator(
+            queryset, per_page, orphans=orphans,
+            allow_empty_first_page=allow_empty_first_page,
+            count_scope=self.get_count_scope(),
+            count_visibility=self.count_visibility, **kwargs)
+
+
+def attach_categories(posts):
+    for post in posts:
+        if not Post.category.is_cached(post):
+            category = categories.get(pk=post.category_id)
+            # Категории нет и в свежей копии — пусть её загрузит Django
+            if category is not None:
+                post.category = category
+
+
+class CardListMixin:
+    """Ленты карточек: категории подставляются из памяти процесса"""
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator, page, object_list, is_paginated = super(
+        ).paginate_queryset(queryset, page_size)
+        if queryset.model is Post:
+            page.object_list = object_list = list(object_list)
+            attach_categories(object_list)
+        return paginator, page, object_list, is_paginated
+
+
+class ProfileListView(Jinja2Mixin, CardListMixin, PostCountMixin,
+                      ListView):
     """Страница профиля залогиненного пользователя"""
 
     model = Post
@@ -54,17 +130,32 @@ class ProfileListView(ListView):
     paginate_by = POSTS_QNT
 
     def get_object(self):
-        return get_object_or_404(User, username=self.kwargs['username'])
+        profile = get_profile(self.kwargs['username'])
+        if profile is None:
+            raise Http404
+        return profile
+
+    def get_count_scope(self):
+        return f'author:{self.profile.id}'
 
     def get_queryset(self):
-        profile = self.get_object()
-        is_author = self.request.user == profile
+        self.profile = self.get_object()
+        is_author = self.request.user == self.profile
+        self.count_visibility = 'total' if is_author else 'published'
         return base_function(add_filter=not is_author,
-                             add_count_comment=True).filter(author=profile)
+                             add_count_comment=True,
+                             card_fields=True).filter(
+                                 author=self.profile)
 
     def get_context_data(self, **kwargs):
+        # Статистику читаем, только если шапки профиля нет в кэше
         return dict(**super().get_context_data(**kwargs),
-                    profile=self.get_object())
+                    profile=self.profile,
+                    is_owner=self.request.user == self.profile,
+                    stats=SimpleLazyObject(
+                        lambda: AuthorStats.objects.for_user(
+                            self.profile.id)),
+                    header_timeout=settings.BLOG_PROFILE_HEADER_TIMEOUT)
 
 
 class ProfileUpdateView(LoginRequiredMixin, UpdateView):
@@ -81,13 +172,40 @@ class ProfileUpdateView(LoginRequiredMixin, UpdateView):
                             kwargs={'username': self.request.user.username})
 
 
-class IndexListView(ListView):
+class IndexListView(Jinja2Mixin, CardListMixin, PostCountMixin,
+                    ListView):
     """Показывает ленту записей"""
 
     template_name = 'blog/index.html'
     ordering = '-pub_date'
     paginate_by = POSTS_QNT
-    queryset = base_function(add_filter=True, add_count_comment=True)
+
+    def get_count_scope(self):
+        return 'index'
+
+    def from_feed(self):
+        """Первые страницы читаем из готовой ленты FeedEntry"""
+        page = self.request.GET.get(self.page_kwarg) or 1
+        if not str(page).isdigit() or int(page) > settings.BLOG_FEED_PAGES:
+            return False
+        # Пустая лента — её ещё не собрали, читаем посты напрямую
+        return FeedEntry.objects.exists()
+
+    def get_queryset(self):
+        from_feed = self.from_feed()
+        blog_metrics.cache_hit('feed', from_feed)
+        if from_feed:
+            return FeedEntry.objects.visible()
+        return base_function(add_filter=True, add_count_comment=True,
+                             card_fields=True)
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator, page, object_list, is_paginated = super(
+        ).paginate_queryset(queryset, page_size)
+        if queryset.model is FeedEntry:
+            page.object_list = object_list = [
+                entry.as_post() for entry in page.object_list]
+        return paginator, page, object_list, is_paginated
 
 
 class PostDetailView(DetailView):
@@ -99,21 +217,57 @@ class PostDetailView(DetailView):
     def get_context_data(self, **kwargs) -> HttpResponse:
         context = super().get_context_data(**kwargs)
         context['form'] = CommentForm()
-        context['comments'] = self.object.comments.select_related('author')
+        context['comments'] = self.object.comments.filter(
+            is_published=True).select_related('author').defer('text')
         return context
 
+    def should_stream(self):
+        threshold = settings.BLOG_STREAM_COMMENTS_THRESHOLD
+        if threshold is None:
+            return False
+        # Счётчик из ленты приходит вместе с постом, без COUNT(*)
+        try:
+            comment_count = self.object.feed_entry.comment_count
+        except FeedEntry.DoesNotExist:
+            # Поста нет в ленте: его видит только автор
+            return False
+        return comment_count >= threshold
+
+    def render_to_response(self, context, **response_kwargs):
+        """Пост с длинным обсуждением отдаём потоком.
+
+        Сначала уходит страница до комментариев, затем комментарии пачками
+        по BLOG_STREAM_COMMENTS_CHUNK_SIZE и в конце остаток страницы.
+        """
+        if not self.should_stream():
+            return super().render_to_response(context, **response_kwargs)
+        context['comments_marker'] = f'<!-- comments {uuid4().hex} -->'
+        head, tail = render_to_string(
+            self.get_template_names(), context, self.request).split(
+                context['comments_marker'])
+        response = StreamingHttpResponse(
+            self.stream_page(head, context['comments'], tail))
+        # Не даём прокси копить ответ целиком
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    def stream_page(self, head, comments, tail):
+        yield head
+        template = get_template('includes/comment_list.html')
+        chunk_size = settings.BLOG_STREAM_COMMENTS_CHUNK_SIZE
+        comments = comments.iterator(chunk_size=chunk_size)
+        while chunk := list(islice(comments, chunk_size)):
+            yield template.render({'comments': chunk}, self.request)
+        yield tail
+
     def get_object(self):
         post = get_object_or_404(Post.objects.all()
-                                 .select_related(
-                                     'location',
-                                     'category',
-                                     'author'), pk=self.kwargs.get('post_id'))
+                                 .select_related('author', 'feed_entry')
+                                 .defer('text'),
+                                 pk=self.kwargs.get('post_id'))
+        attach_categories([post])
         if post.author != self.request.user:
-            if (
-                post.is_published is not True
-                or post.pub_date > timezone.now()
-                or post.category.is_published is not True
-            ):
+            if not post.is_visible or post.pub_date > timezone.now():
                 raise Http404
         return post
 
@@ -147,37 +301,50 @@ class PostDeleteView(LoginRequiredMixin, PostMixin, DeleteView):
     pass
 
 
-class PostCategoryView(ListView):
+class PostCategoryView(Jinja2Mixin, CardListMixin, PostCountMixin,
+                       ListView):
     paginate_by = POSTS_QNT
     template_name = 'blog/category.html'
 
     def get_object(self):
-        return get_object_or_404(Category,
-                                 slug=self.kwargs['category_slug'],
-                                 is_published=True)
+        category = categories.get(slug=self.kwargs['category_slug'])
+        if category is None or not category.is_published:
+            raise Http404
+        return category
+
+    def get_count_scope(self):
+        return f'category:{self.category.id}'
 
     def get_queryset(self):
-        category_slug = self.kwargs['category_slug']
-        return base_function(add_filter=True,
-                             add_count_comment=True).filter(
-                                 category__slug=category_slug)
+        self.category = self.get_object()
+        return base_function(add_filter=True, add_count_comment=True,
+                             card_fields=True).filter(
+                                 category=self.category)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['category'] = self.get_object()
+        context['category'] = self.category
         return context
 
 
 @login_required
 def add_comment(request, post_id) -> HttpResponse:
     """Комменты только для залогиненных пользователей"""
-    post = get_object_or_404(Post, id=post_id)
+    if not Post.objects.filter(id=post_id).exists():
+        raise Http404
     form = CommentForm(request.POST)
     if form.is_valid():
+        retry_after = comment_bucket.take(request.user.id)
+        if retry_after:
+            response = HttpResponse(
+                'Слишком много комментариев, попробуйте позже.',
+                status=429)
+            response['Retry-After'] = retry_after
+            return response
         comment = form.save(commit=False)
         comment.author = request.user
-        comment.post = post
-        comment.save()
+        comment.post_id = post_id
+        ingest.save_comment(comment)
     return redirect('blog:post_detail', post_id=post_id)
 
 
@@ -185,7 +352,7 @@ def add_comment(request, post_id) -> HttpResponse:
 def edit_comment(request, comment_id, post_id) -> HttpResponse:
     """Редактируем комменты"""
     instance = get_object_or_404(Comment, id=comment_id)
-    if instance.author != request.user:
+    if instance.author_id != request.user.id:
         return redirect('login')
     form = CommentForm(request.POST or None, instance=instance)
     context = {'form': form, 'comment': instance}
@@ -200,10 +367,51 @@ def edit_comment(request, comment_id, post_id) -> HttpResponse:
 def delete_comment(request, comment_id, post_id) -> HttpResponse:
     """Удаляем комменты"""
     instance = get_object_or_404(Comment, id=comment_id, post_id=post_id)
-    if instance.author != request.user:
+    if instance.author_id != request.user.id:
         return redirect('login')
     context = {'comment': instance}
     if request.method == 'POST':
         instance.delete()
         return redirect('blog:post_detail', post_id=post_id)
     return render(request, 'blog/comment.html', context)
+
+
+@staff_member_required
+def profiling(request) -> HttpResponse:
+    """Последние замеры профилировщика, ?format=json отдаёт их в JSON"""
+    context = {'samples': list(reversed(samples))}
+    if request.GET.get('format') == 'json':
+        return JsonResponse(context)
+    return render(request, 'blog/profiling.html', context)
+
+
+@staff_member_required
+@require_POST
+def moderate_comments(request) -> HttpResponse:
+    """Скрываем или удаляем комментарии автора, поста или за период"""
+    form = CommentModerationForm(request.POST)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    action = form.cleaned_data['action']
+    count = moderation.moderate_comments(form.get_comments(), action)
+    return JsonResponse({'action': action, 'count': count})
+
+
+@staff_member_required
+@require_POST
+def import_posts(request) -> HttpResponse:
+    """Импорт постов из тела запроса в формате NDJSON"""
+    batches = list(PostImporter().run(request))
+    return JsonResponse({
+        'created': sum(batch['created'] for batch in batches),
+        'batches': batches,
+    })
+
+
+def metrics(request) -> HttpResponse:
+    """Метрики в текстовом формате Prometheus"""
+    remote_addr = request.META.get('REMOTE_ADDR')
+    if remote_addr not in settings.BLOG_METRICS_ALLOWED_IPS:
+        return HttpResponseForbidden()
+    return HttpResponse(blog_metrics.render(),
+                        content_type='text/plain; version=0.0.4')
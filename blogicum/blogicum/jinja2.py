@@ -0,0 +1,53 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.template import defaultfilters
+from django.templatetags.static import static
+from django.utils import formats, timezone
+from django_bootstrap5.templatetags.django_bootstrap5 import bootstrap_css
+from jinja2 import Environment
+from markupsafe import Markup
+
+from blog.paths import fast_reverse
+from blog.templatetags.blog_tags import page_window
+
+
+def localtime(value):
+    if settings.USE_TZ and timezone.is_aware(value):
+        return timezone.localtime(value)
+    return value
+
+
+def date(value, arg=None):
+    """Фильтр date из шаблонов Django с переводом во время сайта"""
+    return defaultfilters.date(localtime(value), arg)
+
+
+def localize(value):
+    return formats.localize(localtime(value), use_l10n=settings.USE_L10N)
+
+
+def cache_fragment(fragment_name, vary_on, timeout, caller):
+    """Тег {% cache %} из шаблонов Django для блока {% call %}"""
+    key = make_template_fragment_key(fragment_name, vary_on)
+    value = cache.get(key)
+    if value is None:
+        value = str(caller())
+        cache.set(key, value, timeout)
+    return Markup(value)
+
+
+def environment(**options):
+    env = Environment(**options)
+    env.globals.update({
+        'url': fast_reverse,
+        'static': static,
+        'bootstrap_css': bootstrap_css,
+        'page_window': page_window,
+        'cache_fragment': cache_fragment,
+    })
+    env.filters.update({
+        'date': date,
+        'localize': localize,
+    })
+    return env
@@ -1,3 +1,5 @@
+import tempfile
+from importlib.util import find_spec
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -28,6 +30,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'blog.middleware.StaticFilesMiddleware',
+    'blog.middleware.MetricsMiddleware',
+    'blog.middleware.PageCacheMiddleware',
+    'blog.middleware.ProfilingMiddleware',
+    'blog.middleware.SlowQueryMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -62,6 +69,22 @@ TEMPLATES = [
     },
 ]
 
+# Jinja2 — необязательный движок для горячих шаблонов лент
+if find_spec('jinja2'):
+    TEMPLATES.append({
+        'NAME': 'jinja2',
+        'BACKEND': 'django.template.backends.jinja2.Jinja2',
+        'DIRS': [BASE_DIR / 'jinja2'],
+        'APP_DIRS': False,
+        'OPTIONS': {
+            'environment': 'blogicum.jinja2.environment',
+        },
+    })
+
+# Имена представлений, которые рендерятся через Jinja2,
+# например ['blog:index', 'blog:category_posts', 'blog:profile']
+BLOG_JINJA2_VIEWS = []
+
 EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 
 EMAIL_FILE_PATH = BASE_DIR / 'sent_emails'
@@ -118,7 +141,86 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 
+# Сюда build_static собирает статику с хэшами и сжатыми копиями
+STATIC_ROOT = BASE_DIR / 'static'
+
+STATICFILES_STORAGE = 'blog.storage.BlogStaticFilesStorage'
+
+# Кэш в памяти процесса годится для одного процесса. Если процессов
+# несколько, нужен общий кэш (Memcached, Redis): через него процессы
+# узнают о смене категорий и мест, версии страниц ленты из
+# blog.pagecache и делят лимиты комментариев
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Сколько номеров страниц показывать вокруг текущей и по краям пагинатора
+BLOG_PAGINATOR_WINDOW = 3
+BLOG_PAGINATOR_ENDS = 1
+
+# Сколько первых страниц главной читать из готовой ленты
+BLOG_FEED_PAGES = 5
+
+# Доля запросов, которые замеряет профилировщик, и размер буфера замеров
+BLOG_PROFILING_SAMPLE_RATE = 0.0
+BLOG_PROFILING_BUFFER_SIZE = 1000
+
+# Порог медленного SQL-запроса в секундах, None отключает журнал
+BLOG_SLOW_QUERY_THRESHOLD = 0.1
+
+# Куда процессы сбрасывают метрики, как часто и кому их отдавать
+BLOG_METRICS_DIR = Path(tempfile.gettempdir()) / 'blogicum_metrics'
+BLOG_METRICS_FLUSH_INTERVAL = 5
+BLOG_METRICS_ALLOWED_IPS = ['127.0.0.1']
+
+# Сколько секунд хранится шапка профиля со статистикой автора
+BLOG_PROFILE_HEADER_TIMEOUT = 300
+
+# Сколько комментариев скрывается или удаляется одним запросом
+BLOG_MODERATION_CHUNK_SIZE = 500
+
+# Дальше этого числа строк списки в админке не пересчитываются
+BLOG_ADMIN_COUNT_LIMIT = 10000
+
+# Как часто процесс сверяет свои копии категорий и мест с общим кэшем
+# и через сколько секунд перечитывает их в любом случае
+BLOG_REFERENCE_CHECK_INTERVAL = 1
+BLOG_REFERENCE_TTL = 60
+
+# Не больше BLOG_COMMENT_BURST комментариев подряд,
+# дальше BLOG_COMMENT_RATE комментариев в секунду
+BLOG_COMMENT_BURST = 10
+BLOG_COMMENT_RATE = 0.5
+# Как часто процесс записывает накопленные счётчики комментариев
+BLOG_COMMENT_FLUSH_INTERVAL = 2
+
+# Импорт постов: размер пачки, число потоков для картинок,
+# таймаут и допустимые схемы адресов картинок
+BLOG_IMPORT_BATCH_SIZE = 500
+BLOG_IMPORT_IMAGE_WORKERS = 8
+BLOG_IMPORT_IMAGE_TIMEOUT = 10
+BLOG_IMPORT_IMAGE_SCHEMES = ('http', 'https')
+
+# Сколько секунд хранится карточка пользователя для страницы профиля
+BLOG_USER_SUMMARY_TIMEOUT = 600
+
+# Сколько секунд браузер кэширует статику без хэша в имени
+BLOG_STATIC_MAX_AGE = 60
+
+# Страницы ленты, которые анонимные читатели получают из кэша,
+# и сколько секунд страница там хранится
+BLOG_PAGE_CACHE_VIEWS = ['blog:index', 'blog:category_posts', 'blog:profile']
+BLOG_PAGE_CACHE_TIMEOUT = 30
+
+# Пост с таким числом комментариев отдаётся потоком, пачками
+# по BLOG_STREAM_COMMENTS_CHUNK_SIZE; None отключает потоковый режим.
+# SQL потока метрики и журнал медленных запросов учитывают при его отдаче
+BLOG_STREAM_COMMENTS_THRESHOLD = 200
+BLOG_STREAM_COMMENTS_CHUNK_SIZE = 100
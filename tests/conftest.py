@@ -41,6 +41,31 @@ def enable_debug_false():
         yield
 
 
+@pytest.fixture(autouse=True)
+def flush_comment_counts_at_once():
+    with override_settings(BLOG_COMMENT_FLUSH_INTERVAL=0):
+        yield
+
+
+@pytest.fixture(autouse=True)
+def disable_page_cache():
+    with override_settings(BLOG_PAGE_CACHE_VIEWS=[]):
+        yield
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    from django.core.cache import cache
+
+    from blog.reference import categories, locations
+
+    cache.clear()
+    categories.reset()
+    locations.reset()
+    yield
+    cache.clear()
+
+
 class SafeImportFromContextManager:
     def __init__(
             self,
@@ -133,6 +158,14 @@ def another_user_client(another_user):
     return client
 
 
+@pytest.fixture
+def staff_client(mixer):
+    client = Client()
+    client.force_login(
+        mixer.blend(get_user_model(), is_staff=True, is_active=True))
+    return client
+
+
 def get_post_list_context_key(
         user_client, page_url, page_load_err_msg, key_missing_msg
 ):
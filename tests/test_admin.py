@@ -0,0 +1,59 @@
+import pytest
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+pytestmark = [pytest.mark.django_db]
+
+
+def changelist_queries(client, url):
+    with CaptureQueriesContext(connection) as ctx:
+        response = client.get(url)
+    assert response.status_code == 200
+    return [q['sql'] for q in ctx.captured_queries]
+
+
+@override_settings(BLOG_ADMIN_COUNT_LIMIT=5)
+@pytest.mark.parametrize('url', ['/admin/blog/post/',
+                                 '/admin/blog/comment/'])
+def test_admin_changelist_queries_are_constant(
+        admin_client, mixer, user, published_category, published_location,
+        url):
+    def add_rows(n):
+        posts = mixer.cycle(n).blend(
+            'blog.Post', author=user, category=published_category,
+            location=published_location)
+        for post in posts:
+            mixer.blend('blog.Comment', post=post, author=user)
+
+    add_rows(10)
+    changelist_queries(admin_client, url)
+    n_queries = len(changelist_queries(admin_client, url))
+    add_rows(20)
+    queries = changelist_queries(admin_client, url)
+    assert len(queries) == n_queries, (
+        'Убедитесь, что число запросов списка в админке не зависит от '
+        'числа строк.')
+    assert not [sql for sql in queries
+                if 'COUNT(' in sql and 'LIMIT' not in sql
+                and 'blog_' in sql], (
+        'Убедитесь, что список в админке не считает строки всей таблицы.')
+
+    queries = changelist_queries(admin_client, f'{url}?author={user.username}')
+    assert len(queries) == n_queries
+
+
+@override_settings(BLOG_ADMIN_COUNT_LIMIT=5)
+def test_filtered_changelist_reaches_every_row(
+        admin_client, mixer, monkeypatch, user, published_category):
+    from blog.admin import PostAdmin
+
+    monkeypatch.setattr(PostAdmin, 'list_per_page', 5)
+    mixer.cycle(12).blend('blog.Post', author=user,
+                          category=published_category)
+    url = f'/admin/blog/post/?author={user.username}'
+    assert admin_client.get(url).context['cl'].result_count == 12
+    response = admin_client.get(f'{url}&p=3')
+    assert response.status_code == 200, (
+        'Убедитесь, что дальние страницы отфильтрованного списка доступны.')
+    assert len(response.context['cl'].result_list) == 2
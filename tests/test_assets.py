@@ -0,0 +1,36 @@
+import gzip
+import re
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.test import override_settings
+
+pytestmark = [pytest.mark.django_db]
+
+
+def test_built_static_is_served_compressed_and_immutable(client, tmp_path):
+    with override_settings(STATIC_ROOT=tmp_path):
+        call_command('build_static', stdout=StringIO())
+        content = client.get('/').content.decode('utf-8')
+        favicon_url = re.search(
+            r'href="(/static/img/fav/favicon\.[0-9a-f]{12}\.ico)"',
+            content).group(1)
+
+        response = client.get(favicon_url, HTTP_ACCEPT_ENCODING='gzip, br')
+        assert response.status_code == 200
+        assert response['Content-Encoding'] == 'gzip'
+        assert 'immutable' in response['Cache-Control']
+        assert response['Vary'] == 'Accept-Encoding'
+        body = gzip.decompress(b''.join(response.streaming_content))
+        assert body == (tmp_path / 'img/fav/favicon.ico').read_bytes()
+
+        response = client.get(favicon_url, HTTP_ACCEPT_ENCODING='gzip;q=0')
+        assert 'Content-Encoding' not in response
+        response = client.get('/static/img/fav/favicon.ico')
+        assert 'immutable' not in response['Cache-Control']
+        response = client.get(favicon_url)
+        response = client.get(favicon_url, HTTP_IF_MODIFIED_SINCE=response[
+            'Last-Modified'])
+        assert response.status_code == 304
+        assert client.get('/static/../manage.py').status_code == 404
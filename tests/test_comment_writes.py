@@ -0,0 +1,115 @@
+import pytest
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+pytestmark = [pytest.mark.django_db]
+
+
+def test_add_comment_checks_post_by_id(
+        user_client, post_with_published_location):
+    post = post_with_published_location
+    with CaptureQueriesContext(connection) as ctx:
+        user_client.post(f'/{post.pk}/comment/', {'text': 'Комментарий'})
+    post_queries = [q['sql'] for q in ctx.captured_queries
+                    if 'FROM "blog_post"' in q['sql']]
+    assert post_queries
+    assert all('"blog_post"."text"' not in sql for sql in post_queries), (
+        'Убедитесь, что при добавлении комментария пост не загружается'
+        ' целиком.')
+    response = user_client.post('/100500/comment/', {'text': 'Комментарий'})
+    assert response.status_code == 404
+
+
+def test_comment_counts_are_coalesced(
+        user_client, user, post_with_published_location):
+    from blog import ingest
+    from blog.models import AuthorStats, FeedEntry
+
+    post = post_with_published_location
+    AuthorStats.objects.refresh(user.pk)
+    ingest.flush(force=True)
+    with override_settings(BLOG_COMMENT_FLUSH_INTERVAL=60):
+        for i in range(3):
+            user_client.post(f'/{post.pk}/comment/', {'text': f'Текст {i}'})
+        assert FeedEntry.objects.get(pk=post.pk).comment_count == 0
+        ingest.flush(force=True)
+    assert FeedEntry.objects.get(pk=post.pk).comment_count == 3
+    assert AuthorStats.objects.get(pk=user.pk).comment_count == 3
+
+
+@override_settings(BLOG_COMMENT_BURST=2, BLOG_COMMENT_RATE=0.001)
+def test_comments_are_rate_limited(
+        user_client, another_user_client, post_with_published_location):
+    from blog.models import Comment
+
+    url = f'/{post_with_published_location.pk}/comment/'
+    for _ in range(2):
+        assert user_client.post(url, {'text': 'Текст'}).status_code == 302
+    response = user_client.post(url, {'text': 'Текст'})
+    assert response.status_code == 429
+    assert int(response['Retry-After']) > 0
+    assert another_user_client.post(
+        url, {'text': 'Текст'}).status_code == 302
+    assert Comment.objects.count() == 3
+
+
+def test_pending_comment_counts_survive_and_reconcile(
+        monkeypatch, django_capture_on_commit_callbacks, user,
+        post_with_published_location):
+    from io import StringIO
+
+    from django.core.management import call_command
+
+    from blog import ingest
+    from blog.models import AuthorStats, Comment, FeedEntry
+
+    post = post_with_published_location
+    AuthorStats.objects.refresh(user.pk)
+    with override_settings(BLOG_COMMENT_FLUSH_INTERVAL=60):
+        with django_capture_on_commit_callbacks(execute=True):
+            ingest.save_comment(Comment(post=post, author=user, text='1'))
+        # Остаток пачки запишет таймер, даже если запросов больше не будет
+        assert ingest.timer is not None
+        ingest.timer.cancel()
+        ingest.timer = None
+
+        def broken_shift(*args):
+            raise RuntimeError
+
+        with monkeypatch.context() as patch:
+            patch.setattr(ingest, 'shift_comment_counts', broken_shift)
+            with pytest.raises(RuntimeError):
+                ingest.flush(force=True)
+        assert ingest.pending_posts == {post.pk: 1}
+        ingest.flush(force=True)
+    assert FeedEntry.objects.get(pk=post.pk).comment_count == 1
+
+    FeedEntry.objects.update(comment_count=0)
+    AuthorStats.objects.update(comment_count=5)
+    call_command('reconcile_counters', stdout=StringIO())
+    assert FeedEntry.objects.get(pk=post.pk).comment_count == 1
+    assert AuthorStats.objects.get(pk=user.pk).comment_count == 1
+
+
+def test_failed_flush_keeps_requests_working(
+        monkeypatch, client, user_client, post_with_published_location):
+    from blog import ingest
+    from blog.models import Comment, FeedEntry
+
+    post = post_with_published_location
+
+    def broken_shift(*args):
+        raise RuntimeError
+
+    with monkeypatch.context() as patch:
+        patch.setattr(ingest, 'shift_comment_counts', broken_shift)
+        response = user_client.post(
+            f'/{post.pk}/comment/', {'text': 'Комментарий'})
+        assert response.status_code == 302
+        assert client.get('/').status_code == 200
+    assert Comment.objects.count() == 1
+    assert ingest.pending_posts == {post.pk: 1}
+    assert client.get('/').status_code == 200
+    assert not ingest.pending_posts
+    assert FeedEntry.objects.get(pk=post.pk).comment_count == 1
@@ -0,0 +1,266 @@
+from datetime import timedelta
+
+import pytest
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+pytestmark = [pytest.mark.django_db]
+
+
+def test_index_reads_feed_entries(
+        client, many_posts_with_published_locations):
+    client.get('/')
+    with CaptureQueriesContext(connection) as ctx:
+        response = client.get('/')
+    assert not [q for q in ctx.captured_queries
+                if 'FROM "blog_post"' in q['sql']], (
+        'Убедитесь, что первые страницы главной читаются из готовой ленты.')
+    post = max(many_posts_with_published_locations,
+               key=lambda post: post.pub_date)
+    assert post.title in response.content.decode('utf-8')
+
+
+def test_index_falls_back_to_posts_without_feed(
+        client, many_posts_with_published_locations):
+    from blog.models import FeedEntry
+
+    FeedEntry.objects.all().delete()
+    response = client.get('/')
+    assert len(response.context['page_obj']) == 10, (
+        'Убедитесь, что главная показывает посты, пока лента не собрана.')
+
+
+def test_feed_entries_follow_writes(
+        mixer, user, post_with_published_location, published_category):
+    from blog.models import FeedEntry
+
+    post = post_with_published_location
+    mixer.cycle(2).blend('blog.Comment', post=post, author=user)
+    assert FeedEntry.objects.get(pk=post.pk).comment_count == 2
+
+    user.username = 'renamed'
+    user.save()
+    assert FeedEntry.objects.get(pk=post.pk).author_username == 'renamed'
+
+    post.pub_date = timezone.now() + timedelta(days=1)
+    post.save()
+    assert not FeedEntry.objects.visible().filter(pk=post.pk).exists()
+
+    published_category.is_published = False
+    published_category.save()
+    assert not FeedEntry.objects.filter(pk=post.pk).exists()
+    published_category.is_published = True
+    published_category.save()
+    assert FeedEntry.objects.filter(pk=post.pk).exists()
+
+
+def test_publish_scheduled_flips_due_posts(
+        mixer, user, published_category):
+    from io import StringIO
+    from unittest import mock
+
+    from django.core.management import call_command
+
+    from blog.models import FeedEntry, PostCounter
+
+    now = timezone.now()
+    post = mixer.blend('blog.Post', author=user, is_published=True,
+                       category=published_category,
+                       pub_date=now + timedelta(hours=1))
+    assert PostCounter.objects.get_count('index') == 0
+    assert not FeedEntry.objects.visible().exists()
+
+    later = now + timedelta(hours=2)
+    with mock.patch('django.utils.timezone.now', return_value=later):
+        call_command('publish_scheduled', '--once', stdout=StringIO())
+        assert FeedEntry.objects.visible().get().pk == post.pk
+    counter = PostCounter.objects.get(scope='index')
+    assert counter.published == 1
+    assert counter.due_at is None
+
+
+def test_publish_scheduled_resumes_after_feed_reads(
+        mixer, user, published_category):
+    from io import StringIO
+    from unittest import mock
+
+    from django.core.management import call_command
+
+    from blog.models import AuthorStats, FeedEntry, PostCounter
+
+    now = timezone.now()
+    old = mixer.blend('blog.Post', author=user, is_published=True,
+                      category=published_category,
+                      pub_date=now - timedelta(days=1))
+    call_command('publish_scheduled', '--once', stdout=StringIO())
+    post = mixer.blend('blog.Post', author=user, is_published=True,
+                       category=published_category,
+                       pub_date=now + timedelta(hours=1))
+    assert AuthorStats.objects.refresh(user.pk).last_post_date == (
+        old.pub_date)
+
+    # Воркер остановлен, а ленту тем временем кто-то открыл
+    with mock.patch('django.utils.timezone.now',
+                    return_value=now + timedelta(hours=2)):
+        assert PostCounter.objects.get_count('index') == 2
+    assert PostCounter.objects.get(scope='index').due_at is None
+
+    stdout = StringIO()
+    with mock.patch('django.utils.timezone.now',
+                    return_value=now + timedelta(hours=3)):
+        call_command('publish_scheduled', '--once', stdout=stdout)
+        assert post.pk in FeedEntry.objects.visible().values_list(
+            'pk', flat=True)
+    assert 'Опубликовано постов: 1' in stdout.getvalue()
+    assert AuthorStats.objects.get(pk=user.pk).last_post_date == (
+        post.pub_date)
+
+
+def test_card_queryset_skips_unused_columns(
+        user_client, user, many_posts_with_published_locations):
+    user_client.get(f'/profile/{user.username}/')
+    with CaptureQueriesContext(connection) as ctx:
+        user_client.get(f'/profile/{user.username}/')
+    feed_sql = [q['sql'] for q in ctx.captured_queries
+                if 'FROM "blog_post"' in q['sql'] and 'LIMIT' in q['sql']]
+    assert len(feed_sql) == 1, (
+        'Убедитесь, что карточки профиля загружаются одним запросом.')
+    assert '"password"' not in feed_sql[0]
+    assert '"description"' not in feed_sql[0]
+    assert '"blog_post"."text"' not in feed_sql[0]
+
+
+def test_excerpt_backfill(mixer, user, published_category):
+    from io import StringIO
+
+    from django.core.management import call_command
+
+    from blog.models import FeedEntry, Post
+
+    words = [f'word{i}' for i in range(30)]
+    post = mixer.blend('blog.Post', author=user, text=' '.join(words),
+                       category=published_category)
+    assert post.excerpt == ' '.join(words[:10]) + ' …'
+    Post.objects.update(text='short text', excerpt='')
+    call_command('backfill_excerpts', '--batch-size', '1',
+                 stdout=StringIO())
+    post.refresh_from_db()
+    assert post.excerpt == 'short text'
+    assert FeedEntry.objects.get(pk=post.pk).excerpt == 'short text'
+
+
+def test_visibility_flag_follows_category(
+        mixer, user_client, user, published_category):
+    from blog.models import Post
+
+    posts = mixer.cycle(3).blend('blog.Post', author=user,
+                                 category=published_category)
+    assert Post.objects.filter(is_visible=True).count() == 3
+    published_category.is_published = False
+    published_category.save()
+    assert not Post.objects.filter(is_visible=True).exists()
+    published_category.is_published = True
+    published_category.save()
+    posts[0].is_published = False
+    posts[0].save(update_fields=['is_published'])
+    assert Post.objects.filter(is_visible=True).count() == 2
+
+    with CaptureQueriesContext(connection) as ctx:
+        user_client.get(f'/category/{published_category.slug}/')
+    feed_sql = [q['sql'] for q in ctx.captured_queries
+                if 'FROM "blog_post"' in q['sql'] and 'LIMIT' in q['sql']]
+    assert feed_sql
+    where = feed_sql[0].split('FROM "blog_post"')[1].split(
+        'WHERE')[1].split('GROUP BY')[0]
+    assert '"blog_category"."is_published"' not in where, (
+        'Убедитесь, что видимость постов не проверяется через категорию.')
+
+
+def test_card_references_come_from_memory(
+        user_client, user, mixer, published_category, published_location):
+    post = mixer.blend('blog.Post', author=user, title='Пост с местом',
+                       category=published_category,
+                       location=published_location)
+    url = f'/profile/{user.username}/'
+    assert published_location.name in user_client.get(url).content.decode()
+
+    published_location.is_published = False
+    published_location.save()
+    with CaptureQueriesContext(connection) as ctx:
+        content = user_client.get(url).content.decode()
+    assert published_location.name not in content
+    assert 'Планета Земля' in content
+    assert published_category.title in content
+    feed_sql = [q['sql'] for q in ctx.captured_queries
+                if 'FROM "blog_post"' in q['sql'] and 'LIMIT' in q['sql']]
+    assert 'blog_location' not in feed_sql[0]
+    assert 'blog_category' not in feed_sql[0], (
+        'Убедитесь, что карточки не присоединяют категории и места.')
+
+    with CaptureQueriesContext(connection) as ctx:
+        response = user_client.get(f'/category/{published_category.slug}/')
+    assert response.status_code == 200
+    assert not [q for q in ctx.captured_queries
+                if 'FROM "blog_category"' in q['sql']]
+
+    response = user_client.get(f'/posts/{post.pk}/')
+    assert published_location.name not in response.content.decode()
+
+
+def test_reference_tables_see_rows_from_other_processes(
+        user_client, user, mixer, published_category):
+    from blog.models import Category, Post
+    from blog.reference import categories
+
+    mixer.blend('blog.Post', author=user, category=published_category)
+    assert user_client.get(f'/profile/{user.username}/').status_code == 200
+    # Другой процесс с отдельным кэшем: версия в нашем кэше не меняется
+    Category.objects.bulk_create([Category(
+        title='Новая', description='-', slug='new-category')])
+    category = Category.objects.get(slug='new-category')
+    Post.objects.filter(author=user).update(category=category)
+    with override_settings(BLOG_REFERENCE_CHECK_INTERVAL=0):
+        assert user_client.get('/category/new-category/').status_code == 200
+        response = user_client.get(f'/profile/{user.username}/')
+    assert response.status_code == 200
+    assert 'Новая' in response.content.decode()
+
+    Category.objects.filter(pk=category.pk).update(title='Переименована')
+    with override_settings(BLOG_REFERENCE_TTL=0):
+        categories.snapshot = categories.snapshot._replace(checked_at=0.0)
+        assert categories.get(pk=category.pk).title == 'Переименована'
+
+
+def test_loaddata_refreshes_derived_columns(client, tmp_path):
+    import json
+    from io import StringIO
+
+    from django.core.management import call_command
+
+    fields = {'created_at': '2022-12-18T23:06:18Z', 'is_published': True}
+    fixture = [
+        {'model': 'auth.user', 'pk': 101, 'fields': {
+            'username': 'loaded', 'password': '!',
+            'date_joined': '2022-12-18T23:00:00Z'}},
+        {'model': 'blog.category', 'pk': 101, 'fields': {
+            **fields, 'title': 'Загруженная', 'description': '-',
+            'slug': 'loaded'}},
+        *({'model': 'blog.post', 'pk': 100 + n, 'fields': {
+            **fields, 'title': f'Загруженный пост {n}',
+            'text': f'Текст поста {n}\nвторая строка',
+            'pub_date': '2022-12-19T00:00:00Z', 'author': 101,
+            'category': 101}} for n in (1, 2)),
+    ]
+    path = tmp_path / 'fixture.json'
+    path.write_text(json.dumps(fixture), encoding='utf-8')
+    call_command('loaddata', str(path), stdout=StringIO())
+
+    content = client.get('/').content.decode('utf-8')
+    assert 'Загруженный пост 1' in content and 'Загруженный пост 2' in content
+    assert 'Текст поста 1' in content
+    content = client.get('/posts/101/').content.decode('utf-8')
+    assert 'Текст поста 1<br>вторая строка' in content
+    content = client.get('/profile/loaded/').content.decode('utf-8')
+    assert 'Публикаций: 2' in content
@@ -0,0 +1,119 @@
+import json
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.test import override_settings
+
+pytestmark = [pytest.mark.django_db]
+
+
+def ndjson(records):
+    return '\n'.join(json.dumps(record, ensure_ascii=False)
+                     for record in records) + '\n'
+
+
+def test_import_posts_command(
+        tmp_path, user, published_category, published_location):
+    from blog.models import FeedEntry, Location, Post, PostCounter
+
+    image = tmp_path / 'photo.png'
+    image.write_bytes(b'png')
+    records = [{
+        'title': f'Пост {i}', 'text': f'Текст поста {i}',
+        'pub_date': '2020-01-01T12:00:00', 'author': user.username,
+        'category': published_category.slug,
+        'location': 'Новое место' if i % 2 else published_location.name,
+    } for i in range(5)]
+    records[0]['image_url'] = image.as_uri()
+    records.append({'title': 'Без автора', 'text': '-',
+                    'pub_date': '2020-01-01', 'author': 'nobody',
+                    'category': published_category.slug})
+    path = tmp_path / 'posts.ndjson'
+    path.write_text(ndjson(records) + 'не json\n', encoding='utf-8')
+
+    stdout, stderr = StringIO(), StringIO()
+    with override_settings(MEDIA_ROOT=tmp_path / 'media',
+                           BLOG_IMPORT_IMAGE_SCHEMES=('file',)):
+        call_command('import_posts', str(path), '--batch-size', '2',
+                     stdout=stdout, stderr=stderr)
+    assert 'Импортировано постов: 5, ошибок: 2' in stdout.getvalue()
+    assert 'Пачка 4' in stdout.getvalue()
+    assert Post.objects.filter(is_visible=True).count() == 5
+    assert FeedEntry.objects.count() == 5
+    assert PostCounter.objects.get_count('index') == 5
+    assert Location.objects.filter(name='Новое место').count() == 1
+    post = Post.objects.get(title='Пост 0')
+    assert post.excerpt == 'Текст поста 0'
+    assert post.text_html == 'Текст поста 0'
+    assert post.image.name.startswith('post_images/photo')
+
+
+def test_import_posts_endpoint(
+        staff_client, user_client, user, published_category):
+    from blog.models import Post
+
+    body = ndjson([{'title': 'Пост', 'text': 'Текст',
+                    'pub_date': '2020-01-01T12:00:00+03:00',
+                    'author': user.username,
+                    'category': published_category.slug,
+                    'image_url': 'file:///etc/passwd'}])
+    url = '/import/posts/'
+    response = user_client.post(url, body,
+                                content_type='application/x-ndjson')
+    assert response.status_code == 302
+    response = staff_client.post(url, body,
+                                 content_type='application/x-ndjson')
+    data = response.json()
+    assert data['created'] == 1
+    assert data['batches'][0]['errors'][0]['line'] == 1
+    assert not Post.objects.get().image
+
+
+@pytest.mark.parametrize('changes', [
+    {'pub_date': 20200101},
+    {'author': ['a', 'b']},
+    {'location': 5},
+    {'is_published': 'no'},
+    {'title': 'x' * 257},
+])
+def test_bad_record_is_rejected_alone(changes, user, published_category):
+    from blog.importer import PostImporter
+    from blog.models import Post
+
+    good = {'title': 'Пост', 'text': 'Текст',
+            'pub_date': '2020-01-01T12:00:00',
+            'author': user.username, 'category': published_category.slug}
+    lines = ndjson([good, {**good, **changes}]).splitlines()
+    reports = list(PostImporter().run(lines))
+    assert reports[0]['created'] == 1
+    assert [error['line'] for error in reports[0]['errors']] == [2]
+    assert Post.objects.count() == 1
+
+
+def test_interrupted_import_refreshes_counters(
+        monkeypatch, user, published_category):
+    from blog import importer
+    from blog.models import AuthorStats, Post, PostCounter
+
+    AuthorStats.objects.refresh(user.pk)
+    assert PostCounter.objects.get_count('index') == 0
+    records = [{'title': f'Пост {i}', 'text': 'Текст',
+                'pub_date': '2020-01-01T12:00:00', 'author': user.username,
+                'category': published_category.slug} for i in range(5)]
+    import_batch = importer.PostImporter.import_batch
+    batches = []
+
+    def failing_batch(self, batch):
+        batches.append(batch)
+        if len(batches) == 3:
+            raise RuntimeError
+        return import_batch(self, batch)
+
+    monkeypatch.setattr(importer.PostImporter, 'import_batch', failing_batch)
+    with pytest.raises(RuntimeError):
+        list(importer.PostImporter(batch_size=2).run(
+            ndjson(records).splitlines()))
+    assert Post.objects.filter(is_visible=True).count() == 4
+    assert PostCounter.objects.get_count('index') == 4
+    assert not AuthorStats.objects.filter(pk=user.pk).exists()
@@ -0,0 +1,51 @@
+import pytest
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+pytestmark = [pytest.mark.django_db]
+
+
+@pytest.fixture
+def comments(mixer, user, another_user, post_with_published_location):
+    post = post_with_published_location
+    return (mixer.cycle(5).blend('blog.Comment', post=post, author=user)
+            + mixer.cycle(2).blend('blog.Comment', post=post,
+                                   author=another_user))
+
+
+def test_moderation_hides_in_chunks(
+        staff_client, user, comments, post_with_published_location):
+    from blog.models import AuthorStats, Comment, FeedEntry
+
+    post = post_with_published_location
+    AuthorStats.objects.refresh(user.pk)
+    with override_settings(BLOG_MODERATION_CHUNK_SIZE=2):
+        with CaptureQueriesContext(connection) as ctx:
+            response = staff_client.post('/moderation/comments/', {
+                'action': 'hide', 'author': user.username})
+    assert response.json() == {'action': 'hide', 'count': 5}
+    assert not [q for q in ctx.captured_queries
+                if '"blog_comment"."text"' in q['sql']], (
+        'Убедитесь, что модерация не загружает комментарии целиком.')
+    assert Comment.objects.filter(is_published=True).count() == 2
+    assert FeedEntry.objects.get(pk=post.pk).comment_count == 2
+    assert AuthorStats.objects.get(pk=user.pk).comment_count == 0
+
+    response = staff_client.post('/moderation/comments/', {
+        'action': 'delete', 'post': post.pk})
+    assert response.json()['count'] == 7
+    assert not Comment.objects.exists()
+    assert FeedEntry.objects.get(pk=post.pk).comment_count == 0
+
+
+def test_moderation_requires_staff_and_filter(
+        staff_client, user_client, comments):
+    from blog.models import Comment
+
+    url = '/moderation/comments/'
+    response = user_client.post(url, {'action': 'delete', 'post': 1})
+    assert response.status_code == 302
+    assert staff_client.post(url, {'action': 'delete'}).status_code == 400
+    assert staff_client.get(url).status_code == 405
+    assert Comment.objects.count() == len(comments)
@@ -0,0 +1,39 @@
+import gzip
+
+import pytest
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+pytestmark = [pytest.mark.django_db]
+
+
+@pytest.fixture(autouse=True)
+def enable_page_cache():
+    with override_settings(BLOG_PAGE_CACHE_VIEWS=['blog:index']):
+        yield
+
+
+def test_anonymous_feed_is_served_precompressed_from_cache(
+        client, user_client, mixer, published_category):
+    mixer.blend('blog.Post', title='Первый пост', category=published_category)
+    first = client.get('/')
+    assert first['Vary'].endswith('Accept-Encoding')
+    assert 'Content-Encoding' not in first
+
+    with CaptureQueriesContext(connection) as ctx:
+        response = client.get('/', HTTP_ACCEPT_ENCODING='gzip, deflate')
+    assert not ctx.captured_queries
+    assert response['Content-Encoding'] == 'gzip'
+    assert int(response['Content-Length']) == len(response.content)
+    assert gzip.decompress(response.content) == first.content
+    assert client.get('/', HTTP_ACCEPT_ENCODING='gzip;q=0').content == (
+        first.content)
+
+    mixer.blend('blog.Post', title='Второй пост', category=published_category)
+    assert 'Второй пост' in client.get('/').content.decode('utf-8')
+
+    with CaptureQueriesContext(connection) as ctx:
+        response = user_client.get('/', HTTP_ACCEPT_ENCODING='gzip')
+    assert ctx.captured_queries
+    assert 'Content-Encoding' not in response
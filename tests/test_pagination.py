@@ -0,0 +1,125 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from conftest import N_PER_PAGE
+
+pytestmark = [pytest.mark.django_db]
+
+
+def count_queries(client, url):
+    with CaptureQueriesContext(connection) as ctx:
+        response = client.get(url)
+    counts = [q for q in ctx.captured_queries
+              if 'COUNT(' in q['sql'] and 'blog_post' in q['sql']
+              and 'LIMIT' not in q['sql']]
+    return response, len(counts)
+
+
+def test_index_count_is_cached(
+        client, many_posts_with_published_locations):
+    _, n_counts = count_queries(client, '/')
+    assert n_counts == 1
+    response, n_counts = count_queries(client, '/')
+    assert n_counts == 0, (
+        'Убедитесь, что общее число постов на главной берётся из счётчика.')
+    assert response.context['page_obj'].paginator.count == len(
+        many_posts_with_published_locations)
+
+
+def test_index_count_reset_on_write(
+        client, mixer, many_posts_with_published_locations):
+    posts = many_posts_with_published_locations
+    client.get('/')
+    mixer.blend('blog.Post', author=posts[0].author,
+                category=posts[0].category)
+    response = client.get('/')
+    paginator = response.context['page_obj'].paginator
+    assert paginator.count == len(posts) + 1, (
+        'Убедитесь, что число постов пересчитывается после записи.')
+    assert paginator.num_pages == len(posts) // N_PER_PAGE + 1
+
+    posts[0].category.is_published = False
+    posts[0].category.save()
+    response = client.get('/')
+    assert response.context['page_obj'].paginator.count == 0
+
+
+def test_counters_follow_writes(
+        mixer, user, published_category, published_location):
+    from blog.models import PostCounter
+
+    counters = PostCounter.objects
+    posts = mixer.cycle(3).blend('blog.Post', author=user,
+                                 category=published_category)
+    scopes = ('index', f'category:{published_category.id}',
+              f'author:{user.id}')
+    for scope in scopes:
+        assert counters.get_count(scope) == 3
+
+    posts[0].is_published = False
+    posts[0].save()
+    posts[1].delete()
+    for scope in scopes:
+        assert counters.get_count(scope) == 1
+    assert counters.get_count(f'author:{user.id}', 'total') == 2
+
+    published_category.is_published = False
+    published_category.save()
+    assert counters.get_count('index') == 0
+    assert counters.get_count(f'author:{user.id}', 'total') == 2
+
+
+def test_failed_counter_shift_rolls_back_post_write(
+        monkeypatch, mixer, user, published_category):
+    from django.utils import timezone
+
+    from blog.models import Post, PostCounter, PostCounterManager
+
+    post = mixer.blend('blog.Post', author=user, category=published_category)
+    assert PostCounter.objects.get_count('index') == 1
+
+    def broken_apply(self, *args, **kwargs):
+        raise RuntimeError
+
+    monkeypatch.setattr(PostCounterManager, 'apply', broken_apply)
+    with pytest.raises(RuntimeError):
+        Post(title='Пост', text='Текст', pub_date=timezone.now(),
+             author=user, category=published_category).save()
+    post.is_published = False
+    with pytest.raises(RuntimeError):
+        post.save()
+    with pytest.raises(RuntimeError):
+        post.delete()
+    assert list(Post.objects.values_list('pk', 'is_published')) == [
+        (post.pk, True)]
+    assert PostCounter.objects.get_count('index') == 1
+
+
+@pytest.mark.parametrize('number', [1, 500, 10000])
+def test_page_window_size_is_constant(number):
+    from django.core.paginator import Paginator
+
+    from blog.templatetags.blog_tags import page_window
+
+    page_obj = Paginator(range(100000), N_PER_PAGE).page(number)
+    pages = list(page_window(page_obj, on_each_side=3, on_ends=1))
+    assert number in pages
+    assert len(pages) <= 2 * 3 + 1 + 2 * (1 + 1), (
+        'Убедитесь, что пагинатор выводит только окно страниц.')
+
+
+def test_reconcile_counters(mixer, user, published_category):
+    from io import StringIO
+
+    from django.core.management import call_command
+
+    from blog.models import Post, PostCounter
+
+    mixer.cycle(2).blend('blog.Post', author=user,
+                         category=published_category)
+    assert PostCounter.objects.get_count('index') == 2
+    Post.objects.update(is_published=False)
+    assert PostCounter.objects.get_count('index') == 2
+    call_command('reconcile_counters', stdout=StringIO())
+    assert PostCounter.objects.get_count('index') == 0
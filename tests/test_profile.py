@@ -0,0 +1,109 @@
+from datetime import timedelta
+
+import pytest
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+pytestmark = [pytest.mark.django_db]
+
+
+def test_profile_header_is_cached(
+        client, mixer, user, published_category):
+    from blog.models import AuthorStats
+
+    url = f'/profile/{user.username}/'
+    post = mixer.blend('blog.Post', author=user, category=published_category)
+    mixer.cycle(2).blend('blog.Comment', post=post, author=user)
+    client.get(url)
+    with CaptureQueriesContext(connection) as ctx:
+        response = client.get(url)
+    assert not [q for q in ctx.captured_queries
+                if 'blog_authorstats' in q['sql']], (
+        'Убедитесь, что шапка профиля берётся из кэша.')
+    assert 'Комментариев: 2' in response.content.decode('utf-8')
+
+    mixer.blend('blog.Comment', post=post, author=user)
+    assert AuthorStats.objects.get(pk=user.pk).comment_count == 3
+    response = client.get(url)
+    content = response.content.decode('utf-8')
+    assert 'Комментариев: 3' in content
+    assert 'Публикаций: 1' in content
+
+
+def test_jinja2_profile_header_is_cached(
+        client, mixer, user, published_category):
+    pytest.importorskip('jinja2')
+    url = f'/profile/{user.username}/'
+    post = mixer.blend('blog.Post', author=user, category=published_category)
+    with override_settings(BLOG_JINJA2_VIEWS=['blog:profile']):
+        client.get(url)
+        with CaptureQueriesContext(connection) as ctx:
+            client.get(url)
+        assert not [q for q in ctx.captured_queries
+                    if 'blog_authorstats' in q['sql']], (
+            'Убедитесь, что шапка профиля в Jinja2 берётся из кэша.')
+
+        mixer.blend('blog.Comment', post=post, author=user)
+        content = client.get(url).content.decode('utf-8')
+    assert 'Комментариев: 1' in content
+
+
+def test_last_post_date_counts_published_posts_only(
+        mixer, user, published_category):
+    from blog.models import AuthorStats
+
+    now = timezone.now()
+    published = mixer.blend('blog.Post', author=user, pub_date=now,
+                            category=published_category)
+    assert AuthorStats.objects.for_user(user.pk).last_post_date == (
+        published.pub_date)
+    mixer.blend('blog.Post', author=user, pub_date=now + timedelta(days=1),
+                category=published_category)
+    mixer.blend('blog.Post', author=user, is_published=False,
+                pub_date=now + timedelta(seconds=1),
+                category=published_category)
+    assert AuthorStats.objects.get(pk=user.pk).last_post_date == (
+        published.pub_date)
+
+    published.is_published = False
+    published.save()
+    assert AuthorStats.objects.get(pk=user.pk).last_post_date is None
+
+
+def test_profile_user_is_cached(client, user_client, user):
+    url = f'/profile/{user.username}/'
+    client.get(url)
+    with CaptureQueriesContext(connection) as ctx:
+        response = client.get(url)
+    assert response.context['profile'] == user
+    assert not [q for q in ctx.captured_queries
+                if 'FROM "auth_user"' in q['sql']], (
+        'Убедитесь, что пользователь профиля берётся из кэша.')
+
+    old_url = url
+    user_client.post('/edit_profile/', {
+        'first_name': 'Новое', 'last_name': 'Имя',
+        'username': 'renamed_user', 'email': 'renamed@example.com'})
+    assert client.get(old_url).status_code == 404
+    response = client.get('/profile/renamed_user/')
+    assert 'Новое Имя' in response.content.decode('utf-8')
+
+
+def test_profile_cache_follows_user_changes(client, user):
+    url = f'/profile/{user.username}/'
+    client.get(url)
+    # Переименование в админке или в shell, мимо формы профиля
+    user.username = 'renamed_in_admin'
+    user.save()
+    assert client.get(url).status_code == 404
+    assert client.get('/profile/renamed_in_admin/').status_code == 200
+
+    from blog.models import AuthorStats
+
+    user_id = user.pk
+    user.delete()
+    assert client.get('/profile/renamed_in_admin/').status_code == 404
+    assert AuthorStats.objects.for_user(user_id).comment_count == 0
+    assert not AuthorStats.objects.filter(user_id=user_id).exists()
@@ -0,0 +1,150 @@
+import sys
+import threading
+
+import pytest
+from django.test import override_settings
+
+pytestmark = [pytest.mark.django_db]
+
+
+def test_profiling_samples_requests(
+        staff_client, user_client, post_with_published_location):
+    from blog.middleware import samples
+
+    samples.clear()
+    with override_settings(BLOG_PROFILING_SAMPLE_RATE=0.0):
+        user_client.get('/')
+    assert not samples
+    with override_settings(BLOG_PROFILING_SAMPLE_RATE=1.0):
+        user_client.get('/')
+    sample = samples[-1]
+    assert sample['view_name'] == 'blog:index'
+    assert sample['sql_count'] > 0
+    assert sample['template_time'] is not None
+    assert sample['response_size'] > 0
+
+    assert user_client.get('/profiling/').status_code == 302
+    response = staff_client.get('/profiling/?format=json')
+    assert response.json()['samples'][0]['view_name'] == 'blog:index'
+    assert staff_client.get('/profiling/').status_code == 200
+
+
+def test_slow_queries_are_attributed_to_views(
+        client, post_with_published_location):
+    from io import StringIO
+
+    from django.core.management import call_command
+
+    from blog.middleware import normalize_sql
+    from blog.models import SlowQuery
+
+    assert normalize_sql(
+        "SELECT * FROM t WHERE id IN (%s, %s) AND a = 'x' LIMIT 10"
+    ) == 'SELECT * FROM t WHERE id IN (...) AND a = ? LIMIT ?'
+
+    with override_settings(BLOG_SLOW_QUERY_THRESHOLD=0):
+        client.get('/')
+        client.get('/')
+    slow = SlowQuery.objects.filter(view_name='blog:index')
+    assert slow.exists()
+    assert any(query.count == 2 for query in slow)
+    assert any(query.explain for query in slow)
+
+    out = StringIO()
+    call_command('slow_queries', '--explain', stdout=out)
+    assert 'blog:index' in out.getvalue()
+
+
+def test_failed_explain_keeps_response(
+        client, monkeypatch, post_with_published_location):
+    from blog import middleware
+    from blog.models import SlowQuery
+
+    assert middleware.explain_sql('default', 'UPDATE blog_post SET id = 1',
+                                  ()) == ''
+
+    def broken_explain(alias, sql, params):
+        raise middleware.connections[alias].Database.OperationalError()
+
+    monkeypatch.setattr(middleware, 'explain_sql', broken_explain)
+    with override_settings(BLOG_SLOW_QUERY_THRESHOLD=0):
+        assert client.get('/').status_code == 200
+    assert not SlowQuery.objects.exists()
+
+
+def test_metrics_endpoint(
+        tmp_path, client, user, post_with_published_location, mixer):
+    with override_settings(BLOG_METRICS_DIR=tmp_path):
+        client.get('/')
+        mixer.blend('blog.Comment', post=post_with_published_location,
+                    author=user)
+        response = client.get('/metrics')
+        assert response.status_code == 200
+        text = response.content.decode('utf-8')
+        assert ('blog_request_duration_seconds_count{view="blog:index"}'
+                in text)
+        assert 'blog_db_queries_total{view="blog:index"}' in text
+        assert ('blog_writes_total{action="created",model="comment"}'
+                in text)
+        assert 'blog_cache_requests_total{cache="feed",result="hit"}' in text
+        assert 'blog_scheduled_posts 0' in text
+        assert list(tmp_path.glob('*.json'))
+        assert client.get(
+            '/metrics', REMOTE_ADDR='10.0.0.1').status_code == 403
+
+
+def test_metrics_flush_survives_file_errors_and_writers(tmp_path, client):
+    from blog import metrics
+
+    not_a_dir = tmp_path / 'metrics'
+    not_a_dir.write_text('')
+    with override_settings(BLOG_METRICS_DIR=not_a_dir,
+                           BLOG_METRICS_FLUSH_INTERVAL=0):
+        assert client.get('/').status_code == 200
+
+    def add_labels():
+        for i in range(100000):
+            metrics.inc('blog_test_total', label=i)
+
+    # Частое переключение потоков, чтобы запись шла прямо во время сброса
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    writer = threading.Thread(target=add_labels)
+    try:
+        with override_settings(BLOG_METRICS_DIR=tmp_path):
+            writer.start()
+            while writer.is_alive():
+                metrics.flush(force=True)
+    finally:
+        writer.join()
+        sys.setswitchinterval(interval)
+        for key in [key for key in metrics.counters
+                    if key[0] == 'blog_test_total']:
+            del metrics.counters[key]
+
+
+def test_streamed_comments_are_measured(
+        user_client, user, post_with_published_location, mixer):
+    from blog import metrics
+    from blog.middleware import samples
+    from blog.models import SlowQuery
+
+    post = post_with_published_location
+    mixer.cycle(5).blend('blog.Comment', post=post, author=user)
+    samples.clear()
+    key = 'blog_db_queries_total', (('view', 'blog:post_detail'),)
+    before = metrics.counters[key]
+    with override_settings(BLOG_STREAM_COMMENTS_THRESHOLD=5,
+                           BLOG_STREAM_COMMENTS_CHUNK_SIZE=2,
+                           BLOG_SLOW_QUERY_THRESHOLD=0,
+                           BLOG_PROFILING_SAMPLE_RATE=1.0):
+        response = user_client.get(f'/posts/{post.id}/')
+        assert response.streaming
+        assert not samples
+        sql_count = metrics.counters[key] - before
+        list(response.streaming_content)
+    assert samples[-1]['sql_count'] > 0
+    # Комментарии читаются уже при отдаче потока
+    assert metrics.counters[key] - before > sql_count
+    assert SlowQuery.objects.filter(
+        view_name='blog:post_detail', sql__contains='blog_comment').exists()
@@ -0,0 +1,139 @@
+import pytest
+
+pytestmark = [pytest.mark.django_db]
+
+
+def test_text_html_rendered_on_save(
+        user_client, user, post_with_published_location, mixer):
+    post = post_with_published_location
+    post.text = 'first <b>line</b>\nsecond'
+    post.save()
+    comment = mixer.blend('blog.Comment', post=post, author=user,
+                          text='a & b\nc')
+    assert post.text_html == 'first &lt;b&gt;line&lt;/b&gt;<br>second'
+    assert comment.text_html == 'a &amp; b<br>c'
+
+    content = user_client.get(f'/posts/{post.id}/').content.decode('utf-8')
+    assert post.text_html in content
+    assert comment.text_html in content
+
+
+@pytest.mark.parametrize('model', ['blog.Post', 'blog.Comment'])
+def test_text_html_follows_update_fields(
+        model, user, post_with_published_location, mixer):
+    from django.apps import apps
+
+    if model == 'blog.Post':
+        instance = post_with_published_location
+    else:
+        instance = mixer.blend(model, post=post_with_published_location,
+                               author=user)
+    instance.text = 'новый\nтекст'
+    instance.save(update_fields=['text'])
+    instance = apps.get_model(model).objects.get(pk=instance.pk)
+    assert instance.text_html == 'новый<br>текст'
+
+
+def test_backfill_html(user, post_with_published_location):
+    from io import StringIO
+
+    from django.core.management import call_command
+
+    from blog.models import Post
+
+    Post.objects.update(text='x\ny', text_html='')
+    call_command('backfill_html', stdout=StringIO())
+    assert Post.objects.get().text_html == 'x<br>y'
+
+
+def normalize_html(content):
+    import re
+
+    html = re.sub(r'\s+', ' ', content.decode('utf-8'))
+    return re.sub(r'>\s+<', '><', html).strip()
+
+
+@pytest.mark.parametrize('view_name', [
+    'blog:index', 'blog:category_posts', 'blog:profile'])
+def test_jinja2_feed_templates_match(
+        user_client, user, view_name, many_posts_with_published_locations):
+    pytest.importorskip('jinja2')
+    from django.test import override_settings
+    from django.urls import reverse
+
+    post = many_posts_with_published_locations[0]
+    args = {
+        'blog:index': [],
+        'blog:category_posts': [post.category.slug],
+        'blog:profile': [user.username],
+    }[view_name]
+    for page in ('1', '2'):
+        url = f'{reverse(view_name, args=args)}?page={page}'
+        django_html = normalize_html(user_client.get(url).content)
+        with override_settings(BLOG_JINJA2_VIEWS=[view_name]):
+            jinja2_html = normalize_html(user_client.get(url).content)
+        assert jinja2_html == django_html, (
+            f'Убедитесь, что Jinja2-шаблон {view_name} совпадает с Django.')
+
+
+@pytest.mark.parametrize('view_name, args', [
+    ('blog:index', []),
+    ('blog:post_detail', [5]),
+    ('blog:profile', ['имя.user@+-_']),
+    ('blog:edit_comment', [3, 7]),
+])
+def test_fast_reverse_matches_reverse(view_name, args):
+    from django.urls import reverse
+
+    from blog.paths import fast_reverse
+
+    assert fast_reverse(view_name, *args) == reverse(view_name, args=args)
+
+
+def test_long_discussion_is_streamed_in_chunks(
+        user_client, user, post_with_published_location, mixer):
+    import re
+
+    from django.db import connection
+    from django.test import override_settings
+    from django.test.utils import CaptureQueriesContext
+
+    post = post_with_published_location
+    mixer.cycle(5).blend('blog.Comment', post=post, author=user)
+    url = f'/posts/{post.id}/'
+    with override_settings(BLOG_STREAM_COMMENTS_THRESHOLD=None):
+        full = user_client.get(url).content
+    with override_settings(BLOG_STREAM_COMMENTS_THRESHOLD=5,
+                           BLOG_STREAM_COMMENTS_CHUNK_SIZE=2):
+        with CaptureQueriesContext(connection) as ctx:
+            response = user_client.get(url)
+        assert response.streaming
+        assert not [q for q in ctx.captured_queries
+                    if 'COUNT(' in q['sql']], (
+            'Убедитесь, что число комментариев берётся из ленты.')
+        chunks = list(response.streaming_content)
+    # Страница до комментариев, три пачки комментариев, остаток страницы
+    assert len(chunks) == 5
+    assert b'<!-- comments' not in b''.join(chunks)
+    # Маска CSRF-токена своя в каждом ответе
+    csrf = re.compile(r'name="csrfmiddlewaretoken" value="\w+"')
+    assert csrf.sub('', normalize_html(b''.join(chunks))) == csrf.sub(
+        '', normalize_html(full))
+
+
+@pytest.mark.parametrize('location_published', [False, None])
+def test_jinja2_card_hides_missing_location(
+        client, mixer, user, published_category, location_published):
+    pytest.importorskip('jinja2')
+    from django.test import override_settings
+
+    location = None
+    if location_published is not None:
+        location = mixer.blend('blog.Location', name='Тайное место',
+                               is_published=location_published)
+    mixer.blend('blog.Post', author=user, category=published_category,
+                location=location)
+    with override_settings(BLOG_JINJA2_VIEWS=['blog:index']):
+        content = client.get('/').content.decode('utf-8')
+    assert 'Планета Земля' in content
+    assert 'None' not in content and 'Тайное место' not in content